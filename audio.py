@@ -1,60 +1,337 @@
+import os
 import time
-from pygame import mixer
-from config import MEDIA_FOLDER
+import heapq
+import threading
+from collections import OrderedDict
+from config import (
+    MEDIA_FOLDER, CAPTURE_REPLAY_PATH, AUDIO_CACHE_MAX_BYTES,
+    CONTROLS, RANKS, RANKS_WITH_DIVISIONS, DIVISIONS, MR_VALUES
+)
+
+if CAPTURE_REPLAY_PATH:
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from pygame import mixer, sndarray
 
 mixer.init()
 
-def play_audio(audio_file, subfolder=None, allow_interrupt=False):
+PRIORITY_HEALTH = 0
+PRIORITY_ANNOUNCEMENT = 1
+PRIORITY_MENU = 2
+
+PLAYBACK_POLL_INTERVAL = 0.02
+CLIP_STREAM_TIMEOUT = 5
+
+class AudioHandle:
+    """Returned by every play_* call; lets the caller wait for or cancel playback"""
+
+    def __init__(self):
+        self.cancelled = False
+        self.preempted = False
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def is_done(self):
+        return self._done.is_set()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _finish(self):
+        self._done.set()
+
+class AudioCache:
+    """Decoded mixer.Sound objects: pinned hot clips plus an LRU bounded by memory"""
+
+    def __init__(self, max_bytes=AUDIO_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._pinned = {}
+        self._lru = OrderedDict()
+        self._lru_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, audio_path, side=None):
+        key = (str(audio_path), side)
+        with self._lock:
+            sound = self._pinned.get(key)
+            if sound is None and key in self._lru:
+                self._lru.move_to_end(key)
+                sound = self._lru[key][0]
+            if sound is not None:
+                self.hits += 1
+                return sound
+            self.misses += 1
+
+        sound = self._load(audio_path, side)
+        size = sound_bytes(sound)
+        with self._lock:
+            if key not in self._lru:
+                self._lru[key] = (sound, size)
+                self._lru_bytes += size
+            while self._lru_bytes > self.max_bytes and len(self._lru) > 1:
+                _, (_, evicted_size) = self._lru.popitem(last=False)
+                self._lru_bytes -= evicted_size
+        return sound
+
+    def preload(self, audio_path, side=None):
+        key = (str(audio_path), side)
+        with self._lock:
+            if key in self._pinned:
+                return
+        sound = self._load(audio_path, side)
+        with self._lock:
+            self._pinned[key] = sound
+
+    def stats(self):
+        with self._lock:
+            pinned_bytes = sum(sound_bytes(sound) for sound in self._pinned.values())
+            total = self.hits + self.misses
+            return {
+                "pinned": len(self._pinned),
+                "cached": len(self._lru),
+                "bytes": pinned_bytes + self._lru_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+    def _load(self, audio_path, side):
+        sound = mixer.Sound(str(audio_path))
+        if side is None or mixer.get_init()[2] != 2:
+            return sound
+        samples = sndarray.array(sound)
+        samples[:, 1 if side == "left" else 0] = 0
+        return sndarray.make_sound(samples)
+
+def sound_bytes(sound):
+    frequency, size, channels = mixer.get_init()
+    return int(sound.get_length() * frequency) * channels * abs(size) // 8
+
+class ClipStream:
+    """Clip paths handed to the engine while later clips are still being resolved"""
+
+    def __init__(self):
+        self._clips = []
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def append(self, audio_path):
+        with self._condition:
+            self._clips.append(audio_path)
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._condition:
+                while index >= len(self._clips) and not self._closed:
+                    if not self._condition.wait(CLIP_STREAM_TIMEOUT):
+                        print("Announcement timed out waiting for its next clip")
+                        return
+                if index >= len(self._clips):
+                    return
+                audio_path = self._clips[index]
+            index += 1
+            yield audio_path
+
+class AudioRequest:
+    def __init__(self, clips, priority, interruptible=False, preempt=False, side=None):
+        self.clips = clips
+        self.priority = priority
+        self.interruptible = interruptible
+        self.preempt = preempt
+        self.side = side
+        self.handle = AudioHandle()
+
+class AudioEngine:
+    """Plays queued requests on a worker thread, highest priority first"""
+
+    def __init__(self):
+        self._queue = []
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def submit(self, request):
+        with self._condition:
+            if request.interruptible:
+                for _, _, queued in self._queue:
+                    if queued.interruptible and queued.priority == request.priority:
+                        queued.handle.cancel()
+            self._sequence += 1
+            heapq.heappush(self._queue, (request.priority, self._sequence, request))
+            self._condition.notify_all()
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="AudioEngine", daemon=True)
+                self._thread.start()
+        return request.handle
+
+    def shutdown(self, wait=True, timeout=10):
+        with self._condition:
+            self._stopping = True
+            if not wait:
+                for _, _, queued in self._queue:
+                    queued.handle.cancel()
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _next_request(self):
+        with self._condition:
+            while True:
+                while self._queue and self._queue[0][2].handle.cancelled:
+                    heapq.heappop(self._queue)[2].handle._finish()
+                if self._queue:
+                    return heapq.heappop(self._queue)[2]
+                if self._stopping:
+                    return None
+                self._condition.wait()
+
+    def _should_preempt(self, current):
+        if current.handle.cancelled:
+            return True
+        if current.priority == PRIORITY_ANNOUNCEMENT:
+            return False
+        for _, _, queued in sorted(self._queue, key=lambda entry: entry[:2]):
+            if queued.handle.cancelled:
+                continue
+            if queued.priority < current.priority:
+                return True
+            return queued.preempt and current.interruptible and queued.priority == current.priority
+        return False
+
+    def _run(self):
+        while True:
+            request = self._next_request()
+            if request is None:
+                return
+            try:
+                self._play(request)
+            finally:
+                request.handle._finish()
+
+    def _play(self, request):
+        for audio_path in request.clips:
+            try:
+                channel = _audio_cache.get(audio_path, request.side).play()
+                if channel is None:
+                    raise RuntimeError("no free mixer channel")
+            except Exception as e:
+                print(f"Error playing audio {audio_path.name}: {e}")
+                continue
+
+            with self._condition:
+                while channel.get_busy():
+                    if self._should_preempt(request):
+                        channel.stop()
+                        request.handle.preempted = True
+                        return
+                    self._condition.wait(PLAYBACK_POLL_INTERVAL)
+
+_audio_cache = AudioCache()
+_engine = AudioEngine()
+
+def _finished_handle():
+    handle = AudioHandle()
+    handle._finish()
+    return handle
+
+def play_audio(audio_file, subfolder=None, allow_interrupt=False, preempt=None, priority=PRIORITY_MENU):
     if subfolder:
         audio_path = MEDIA_FOLDER / subfolder / audio_file
     else:
         audio_path = MEDIA_FOLDER / audio_file
-    
+
     if not audio_path.exists():
         print(f"Audio file not found: {audio_file}")
-        return
-    
-    try:
-        if allow_interrupt and mixer.music.get_busy():
-            mixer.music.stop()
-        
-        mixer.music.load(str(audio_path))
-        mixer.music.play()
-        
-        if not allow_interrupt:
-            while mixer.music.get_busy():
-                time.sleep(0.05)
-    except Exception as e:
-        print(f"Error playing audio {audio_file}: {e}")
+        return _finished_handle()
+
+    if preempt is None:
+        preempt = allow_interrupt
+    return _engine.submit(AudioRequest([audio_path], priority, allow_interrupt, preempt))
 
 def play_audio_sequence(audio_files):
+    audio_paths = []
     for audio_file in audio_files:
         audio_path = MEDIA_FOLDER / audio_file
         if not audio_path.exists():
             print(f"Audio file not found: {audio_file}")
             continue
-        try:
-            mixer.music.load(str(audio_path))
-            mixer.music.play()
-            while mixer.music.get_busy():
-                time.sleep(0.1)
-        except Exception as e:
-            print(f"Error playing audio {audio_file}: {e}")
+        audio_paths.append(audio_path)
+    if not audio_paths:
+        return _finished_handle()
+    return _engine.submit(AudioRequest(audio_paths, PRIORITY_ANNOUNCEMENT))
+
+class Announcement:
+    """Streaming play_audio_sequence: each clip is queued as soon as it is added, in order"""
+
+    def __init__(self):
+        self.audio_files = []
+        self.first_clip_time = None
+        self.last_clip_time = None
+        self._stream = ClipStream()
+        self._handle = None
+
+    def add(self, audio_file):
+        self.audio_files.append(audio_file)
+        audio_path = MEDIA_FOLDER / audio_file
+        if not audio_path.exists():
+            print(f"Audio file not found: {audio_file}")
+            return
+        self._stream.append(audio_path)
+        self.last_clip_time = time.perf_counter()
+        if self._handle is None:
+            self.first_clip_time = self.last_clip_time
+            self._handle = _engine.submit(AudioRequest(self._stream, PRIORITY_ANNOUNCEMENT))
+
+    def close(self):
+        self._stream.close()
+        return self._handle or _finished_handle()
 
 def play_health_alert(side):
     audio_path = MEDIA_FOLDER / "CA_health.ogg"
     if not audio_path.exists():
         print(f"Audio file not found: CA_health.ogg")
-        return
+        return _finished_handle()
+
+    return _engine.submit(AudioRequest([audio_path], PRIORITY_HEALTH, side=side))
+
+def preload_audio():
+    hot_clips = ["Unknown.ogg"]
+    hot_clips += [f"{control}.ogg" for control in CONTROLS]
+    hot_clips += [f"{rank}.ogg" for rank in RANKS]
+    hot_clips += [f"{rank}{division}.ogg" for rank in RANKS_WITH_DIVISIONS for division in DIVISIONS]
+    hot_clips += [f"{mr_value}.ogg" for mr_value in MR_VALUES]
     
     try:
-        sound = mixer.Sound(str(audio_path))
-        channel = sound.play()
-        if side == "left":
-            channel.set_volume(1.0, 0.0)
-        else:
-            channel.set_volume(0.0, 1.0)
-        while channel.get_busy():
-            time.sleep(0.05)
+        for audio_file in hot_clips:
+            audio_path = MEDIA_FOLDER / audio_file
+            if audio_path.exists():
+                _audio_cache.preload(audio_path)
+        health_alert_path = MEDIA_FOLDER / "CA_health.ogg"
+        if health_alert_path.exists():
+            _audio_cache.preload(health_alert_path, "left")
+            _audio_cache.preload(health_alert_path, "right")
     except Exception as e:
-        print(f"Error playing health alert: {e}")
+        print(f"Error preloading audio: {e}")
+    
+    stats = _audio_cache.stats()
+    print(f"Preloaded {stats['pinned']} audio clips ({stats['bytes'] / 1024 / 1024:.1f} MB)\n")
+
+def audio_cache_stats():
+    return _audio_cache.stats()
+
+def shutdown_audio(wait=True):
+    _engine.shutdown(wait)
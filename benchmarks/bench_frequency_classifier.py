@@ -0,0 +1,58 @@
+"""FrequencyClassifier's bound pass against scoring every template as the family grows
+
+Usage: python benchmarks/bench_frequency_classifier.py [--sizes 13 30 100 300 1000] [--rounds N]
+
+Builds binarized banks of synthetic name banners and times TemplateBank.match
+next to the classifier's lower-bound pass, once when its guess is the template
+on screen and once when it is not. The size where a correct guess starts
+winning sets CLASSIFIER_MIN_BOUND_TEMPLATES; a wrong guess always costs more.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import classifier
+from bench_signature_index import REGION, names
+from classifier import FrequencyClassifier
+from config import CHARACTER_THRESHOLD
+from image_processing import TemplateBank
+
+def bench(match, img, rounds):
+    match(img)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        match(img)
+    return (time.perf_counter() - start) / rounds
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[13, 30, 100, 300, 1000])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    # Every size takes the bound pass here, whatever the configured cut-off
+    classifier.CLASSIFIER_MIN_BOUND_TEMPLATES = 0
+    rng = np.random.default_rng(0)
+    print(f"{'templates':>9} {'exhaustive':>11} {'guess hit':>10} {'guess miss':>11}")
+    for size in args.sizes:
+        images = names(size, rng)
+        bank = TemplateBank(images, REGION, CHARACTER_THRESHOLD)
+        templates = FrequencyClassifier(f"bench{size}", bank, 0.5)
+        img = images[bank.names[size // 2]]
+
+        exhaustive = bench(bank.match, img, args.rounds)
+        templates._guess = size // 2
+        hit = bench(templates.best_match, img, args.rounds)
+        templates._guess = 0
+        miss = bench(templates.best_match, img, args.rounds)
+        print(f"{size:>9} {exhaustive * 1e6:8.1f} us {hit * 1e6:7.1f} us {miss * 1e6:8.1f} us")
+
+if __name__ == "__main__":
+    main()
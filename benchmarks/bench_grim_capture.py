@@ -0,0 +1,75 @@
+"""Per-region grim captures against one batched grab of the VS-screen regions
+
+Usage: python benchmarks/bench_grim_capture.py [--real] [--rounds N]
+
+Runs against tests/stub_grim.py unless --real is given, in which case the grim
+found on PATH captures the live screen.
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import capture
+from capture import CaptureSession, bounding_region
+from config import (
+    CONTROL_REGIONS, CONTROL_COLOR_REGIONS, NAME_REGIONS, CHARACTER_REGIONS, RANK_REGIONS, DIVISION_REGIONS, MR_REGIONS
+)
+
+# vs_screen.VS_SCREEN_REGIONS, spelled out so the benchmark does not open the audio device
+VS_SCREEN_REGIONS = (
+    CONTROL_REGIONS + CONTROL_COLOR_REGIONS + NAME_REGIONS + CHARACTER_REGIONS +
+    RANK_REGIONS + DIVISION_REGIONS + MR_REGIONS
+)
+
+def stub_grim(directory):
+    script = Path(directory) / "grim"
+    source = (ROOT / "tests" / "stub_grim.py").read_text().split("\n", 1)[1]
+    script.write_text(f"#!{sys.executable}\n{source}")
+    script.chmod(0o755)
+    return str(script)
+
+def per_region(regions):
+    return [capture.capture_region(region) for region in regions]
+
+def batched(regions):
+    frame = capture.capture_snapshot(regions)
+    return [frame.region(region) for region in regions]
+
+def bench(name, grab, regions, rounds):
+    grab(regions)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        grab(regions)
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"{name:>10}: {elapsed * 1000:8.1f} ms per pass")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--real", action="store_true", help="use the grim on PATH instead of the stub")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        session = CaptureSession()
+        session.method = 'grim'
+        session.grim_path = shutil.which("grim") if args.real else stub_grim(directory)
+        if not session.grim_path:
+            sys.exit("grim not found on PATH")
+        capture._session = session
+
+        regions = list(VS_SCREEN_REGIONS)
+        bounds = bounding_region(regions)
+        print(f"{len(regions)} regions, union {bounds['width']}x{bounds['height']}, grim: {session.grim_path}")
+        slow = bench("per-region", per_region, regions, args.rounds)
+        fast = bench("batched", batched, regions, args.rounds)
+        print(f"speedup: {slow / fast:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""SignatureIndex against an exhaustive TemplateBank search as the character bank grows
+
+Usage: python benchmarks/bench_signature_index.py [--sizes 30 100 500 1000] [--probes N]
+
+Builds binarized banks of synthetic character-name banners and times both
+searches on noisy and misaligned copies of their templates plus blank and random
+ROIs. Every probe's result is checked to be identical between the two. The size
+where the index starts winning sets SIGNATURE_INDEX_MIN_TEMPLATES.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from config import CHARACTER_REGIONS, CHARACTER_THRESHOLD
+from image_processing import SignatureIndex, TemplateBank
+
+REGION = CHARACTER_REGIONS[0]
+
+def names(count, rng):
+    """Character-name banners like media/characters: random capitals in a heavy font, white on black"""
+    size = (REGION["width"], REGION["height"])
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    images = {}
+    while len(images) < count:
+        name = "".join(rng.choice(letters, rng.integers(3, 7)))
+        img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        scale = min(1.3, 5.0 / len(name))
+        cv2.putText(img, name, (2, size[1] - 6), cv2.FONT_HERSHEY_DUPLEX, scale, (255, 255, 255), 3)
+        images[name] = img
+    return images
+
+def probes(images, count, rng):
+    shape = (REGION["height"], REGION["width"], 3)
+    names = list(images)
+    result = [np.zeros(shape, dtype=np.uint8), rng.integers(0, 256, shape, dtype=np.uint8)]
+    while len(result) < count:
+        img = images[names[rng.integers(len(names))]]
+        if rng.random() < 0.5:
+            img = np.roll(img, tuple(rng.integers(-2, 3, 2)), axis=(0, 1))
+        noise = rng.integers(-30, 31, shape)
+        result.append(np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    return result
+
+def bench(match, captures, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for img in captures:
+            match(img)
+    return (time.perf_counter() - start) / (rounds * len(captures))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 100, 500, 1000])
+    parser.add_argument("--probes", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'templates':>9} {'exhaustive':>11} {'index':>9} {'speedup':>8} {'scored':>7} {'differences':>12}")
+    for size in args.sizes:
+        images = names(size, rng)
+        bank = TemplateBank(images, REGION, CHARACTER_THRESHOLD)
+        index = SignatureIndex(bank)
+        captures = probes(images, args.probes, rng)
+
+        differences = 0
+        for img in captures:
+            expected, result = bank.match(img), index.match(img)
+            if (result.name, result.similarity, result.runner_up, result.runner_up_similarity) != \
+                    (expected.name, expected.similarity, expected.runner_up, expected.runner_up_similarity):
+                differences += 1
+        scored = index.stats()["average_scored"]
+
+        exhaustive = bench(bank.match, captures, args.rounds)
+        indexed = bench(index.match, captures, args.rounds)
+        print(f"{size:>9} {exhaustive * 1000:8.3f} ms {indexed * 1000:6.3f} ms {exhaustive / indexed:7.1f}x "
+              f"{scored:7.1f} {differences:>12}")
+
+if __name__ == "__main__":
+    main()
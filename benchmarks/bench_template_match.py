@@ -0,0 +1,72 @@
+"""TemplateBank.match against the per-template compare_* loop it replaced
+
+Usage: python benchmarks/bench_template_match.py [--rounds N]
+
+Times both on the shipped media/ templates and, with tracemalloc, reports the
+memory a steady-state call allocates. The bank should stay at a few hundred
+bytes of Python objects whatever the family, with no array allocated per call.
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "tests"))
+
+import reference_compare
+from image_processing import TemplateBank
+from test_template_bank import FAMILIES, live_captures
+
+def bench(match, captures, rounds):
+    for img in captures:
+        match(img)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for img in captures:
+            match(img)
+    return (time.perf_counter() - start) / (rounds * len(captures))
+
+def allocated(match, captures):
+    """Net and peak bytes traced while matching each capture once, after a traced warm-up pass"""
+    tracemalloc.start()
+    try:
+        for img in captures:
+            match(img)
+        worst = 0
+        start = tracemalloc.get_traced_memory()[0]
+        for img in captures:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            match(img)
+            worst = max(worst, tracemalloc.get_traced_memory()[1] - before)
+        return tracemalloc.get_traced_memory()[0] - start, worst
+    finally:
+        tracemalloc.stop()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'family':>14} {'N':>3} {'loop us':>9} {'bank us':>9} {'speedup':>8} {'loop peak':>10} {'bank peak':>10} {'bank net':>9}")
+    for family in sorted(FAMILIES):
+        load, region, threshold, compare = FAMILIES[family]
+        images = load()
+        bank = TemplateBank(images, region, threshold)
+        captures = live_captures(images, region)
+
+        def loop(img):
+            return reference_compare.best_match(compare, img, images)
+
+        slow = bench(loop, captures, args.rounds)
+        fast = bench(bank.match, captures, args.rounds)
+        _, loop_peak = allocated(loop, captures)
+        bank_net, bank_peak = allocated(bank.match, captures)
+        print(f"{family:>14} {len(images):>3} {slow * 1e6:9.1f} {fast * 1e6:9.1f} {slow / fast:7.1f}x "
+              f"{loop_peak:>10} {bank_peak:>10} {bank_net:>9}")
+
+if __name__ == "__main__":
+    main()
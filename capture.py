@@ -4,57 +4,20 @@ import platform
 import subprocess
 import glob
 import os
+import json
+import shutil
+import threading
+import time
+from pathlib import Path
+from config import CAPTURE_INTERVAL, CAPTURE_BUFFER_SIZE
+from replay import FrameRecorder, ReplayBackend
 
 IS_WINDOWS = platform.system() == "Windows"
 IS_LINUX = platform.system() == "Linux"
 
-_capture_method = None
-_grim_path = None
+PROBE_REGION = {"top": 0, "left": 0, "width": 1, "height": 1}
 
-def capture_region_windows(region):
-    import mss
-    with mss.mss() as sct:
-        screenshot = sct.grab(region)
-        img = np.array(screenshot)
-        img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-    return img
-
-def capture_region_linux(region):
-    global _capture_method, _grim_path
-    
-    left = region["left"]
-    top = region["top"]
-    width = region["width"]
-    height = region["height"]
-    
-    if _capture_method == 'mss':
-        import mss
-        with mss.mss() as sct:
-            screenshot = sct.grab(region)
-            img = np.array(screenshot)
-            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-        return img
-    
-    if _capture_method == 'grim' and _grim_path:
-        geometry = f"{left},{top} {width}x{height}"
-        result = subprocess.run([_grim_path, '-g', geometry, '-'], 
-                                capture_output=True, check=True, timeout=2)
-        img_array = np.frombuffer(result.stdout, dtype=np.uint8)
-        img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-        return img
-    
-    # Try mss first
-    try:
-        import mss
-        with mss.mss() as sct:
-            screenshot = sct.grab(region)
-            img = np.array(screenshot)
-            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-        _capture_method = 'mss'
-        return img
-    except Exception:
-        pass
-    
+def find_grim_candidates():
     grim_paths = ['/run/current-system/sw/bin/grim']
     user_home = os.path.expanduser('~')
     grim_paths.append(f'{user_home}/.nix-profile/bin/grim')
@@ -69,26 +32,367 @@ def capture_region_linux(region):
         pass
     
     grim_paths.append('grim')
-    geometry = f"{left},{top} {width}x{height}"
-    
-    for grim_path in grim_paths:
-        try:
-            result = subprocess.run([grim_path, '-g', geometry, '-'], 
-                                    capture_output=True, check=True, timeout=2)
-            img_array = np.frombuffer(result.stdout, dtype=np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            _capture_method = 'grim'
-            _grim_path = grim_path
-            return img
-        except (subprocess.CalledProcessError, FileNotFoundError):
+    return grim_paths
+
+def parse_ppm(data):
+    """Wrap the pixels of a binary (P6) PPM in an RGB array without decoding"""
+    fields = []
+    pos = 0
+    while len(fields) < 4:
+        while data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b'#':
+            pos = data.index(b'\n', pos) + 1
             continue
-    
-    raise RuntimeError("Could not capture screen. mss failed and grim not found.")
+        end = pos
+        while end < len(data) and not data[end:end + 1].isspace():
+            end += 1
+        fields.append(data[pos:end])
+        pos = end
+    if fields[0] != b'P6' or int(fields[3]) > 255:
+        raise ValueError("Expected an 8-bit binary PPM image")
+    width, height = int(fields[1]), int(fields[2])
+    pixels = np.frombuffer(data, dtype=np.uint8, count=width * height * 3, offset=pos + 1)
+    return pixels.reshape(height, width, 3)
 
-def capture_region(region):
-    if IS_WINDOWS:
-        return capture_region_windows(region)
-    elif IS_LINUX:
-        return capture_region_linux(region)
+class CaptureSession:
+    """Long-lived screen capture backend, probed once and reused for every grab"""
+
+    realtime = True
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.method = None
+        self.grim_path = None
+        self.capture_count = 0
+        self.failure_count = 0
+        self.last_error = None
+        self._local = threading.local()
+        self._mss_instances = []
+        self._lock = threading.Lock()
+
+    def open(self):
+        if self.method:
+            return self
+        if not self._load_cache():
+            self._probe()
+            self._save_cache()
+        print(f"Screen capture backend: {self.method}" + (f" ({self.grim_path})" if self.grim_path else ""))
+        return self
+
+    def close(self):
+        with self._lock:
+            for sct in self._mss_instances:
+                try:
+                    sct.close()
+                except Exception:
+                    pass
+            self._mss_instances = []
+        self._local = threading.local()
+        self.method = None
+
+    def health(self):
+        return {
+            "open": self.method is not None,
+            "method": self.method,
+            "grim_path": self.grim_path,
+            "captures": self.capture_count,
+            "failures": self.failure_count,
+            "last_error": self.last_error
+        }
+
+    def now(self):
+        return time.time()
+
+    def next_tick(self):
+        pass
+
+    def grab(self, region):
+        if not self.method:
+            self.open()
+        try:
+            img = self._grab_with(self.method, region)
+        except Exception as e:
+            self.failure_count += 1
+            self.last_error = str(e)
+            raise
+        self.capture_count += 1
+        return img
+
+    def _grab_with(self, method, region):
+        if method == 'mss':
+            return self._grab_mss(region)
+        if method == 'grim':
+            return self._grab_grim(region)
+        raise RuntimeError(f"Unknown capture method: {method}")
+
+    def _get_mss(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            import mss
+            sct = mss.mss()
+            self._local.sct = sct
+            with self._lock:
+                self._mss_instances.append(sct)
+        return sct
+
+    def _grab_mss(self, region):
+        screenshot = self._get_mss().grab(region)
+        img = np.array(screenshot)
+        return cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+
+    def _grab_grim(self, region):
+        geometry = f"{region['left']},{region['top']} {region['width']}x{region['height']}"
+        result = subprocess.run([self.grim_path, '-t', 'ppm', '-g', geometry, '-'], 
+                                capture_output=True, check=True, timeout=2)
+        return cv2.cvtColor(parse_ppm(result.stdout), cv2.COLOR_RGB2BGR)
+
+    def _probe(self):
+        if not IS_WINDOWS and not IS_LINUX:
+            raise NotImplementedError(f"Unsupported OS: {platform.system()}")
+        
+        try:
+            self._grab_mss(PROBE_REGION)
+            self.method = 'mss'
+            return
+        except Exception:
+            if IS_WINDOWS:
+                raise
+        
+        for grim_path in find_grim_candidates():
+            try:
+                self.grim_path = grim_path
+                self._grab_grim(PROBE_REGION)
+                self.method = 'grim'
+                return
+            except (subprocess.CalledProcessError, FileNotFoundError, OSError):
+                continue
+        
+        self.grim_path = None
+        raise RuntimeError("Could not capture screen. mss failed and grim not found.")
+
+    def _load_cache(self):
+        if not self.cache_path or not Path(self.cache_path).exists():
+            return False
+        try:
+            with open(self.cache_path, 'r') as f:
+                cached = json.load(f)
+            method = cached.get("method")
+            grim_path = cached.get("grim_path")
+            if method == 'grim' and not (grim_path and (os.path.exists(grim_path) or shutil.which(grim_path))):
+                return False
+            if method not in ('mss', 'grim'):
+                return False
+            self.method = method
+            self.grim_path = grim_path if method == 'grim' else None
+            self._grab_with(self.method, PROBE_REGION)
+            return True
+        except Exception as e:
+            print(f"Ignoring capture cache: {e}")
+            self.close()
+            self.grim_path = None
+            return False
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, 'w') as f:
+                json.dump({"method": self.method, "grim_path": self.grim_path}, f)
+        except Exception as e:
+            print(f"Could not save capture cache: {e}")
+
+_session = CaptureSession()
+
+def open_capture_session(cache_path=None, replay_path=None, realtime=True):
+    global _session
+    _session.close()
+    if replay_path:
+        _session = ReplayBackend(replay_path, realtime)
     else:
-        raise NotImplementedError(f"Unsupported OS: {platform.system()}")
+        _session = CaptureSession(cache_path)
+    return _session.open()
+
+def get_capture_session():
+    return _session
+
+def capture_region(region):
+    return _session.grab(region)
+
+def bounding_region(regions):
+    left = min(region["left"] for region in regions)
+    top = min(region["top"] for region in regions)
+    right = max(region["left"] + region["width"] for region in regions)
+    bottom = max(region["top"] + region["height"] for region in regions)
+    return {"top": top, "left": left, "width": right - left, "height": bottom - top}
+
+def region_contains(outer, inner):
+    return (inner["left"] >= outer["left"] and inner["top"] >= outer["top"] and
+            inner["left"] + inner["width"] <= outer["left"] + outer["width"] and
+            inner["top"] + inner["height"] <= outer["top"] + outer["height"])
+
+class FrameSnapshot:
+    """One screen grab shared by every detector that reads from it in a tick"""
+
+    def __init__(self, img, left, top, timestamp=None):
+        self.img = img
+        self.left = left
+        self.top = top
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def contains(self, region):
+        height, width = self.img.shape[:2]
+        bounds = {"top": self.top, "left": self.left, "width": width, "height": height}
+        return region_contains(bounds, region)
+
+    def region(self, region):
+        if not self.contains(region):
+            raise ValueError(f"Region {region} is outside the captured frame")
+        y = region["top"] - self.top
+        x = region["left"] - self.left
+        return self.img[y:y + region["height"], x:x + region["width"]]
+
+class FrameGrabber:
+    """Background thread keeping the newest screen grabs in a small ring buffer"""
+
+    def __init__(self, regions, interval=CAPTURE_INTERVAL, buffer_size=CAPTURE_BUFFER_SIZE, record_path=None):
+        self.bounds = bounding_region(regions) if regions else None
+        self.interval = interval
+        self.max_age = 2 * interval
+        self.recorder = FrameRecorder(record_path, self.bounds, regions) if record_path else None
+        self.frame_count = 0
+        self.dropped_frames = 0
+        self.failure_count = 0
+        self._frames = [None] * buffer_size
+        self._last_read = 0
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="FrameGrabber", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self._thread = None
+        if self.recorder:
+            self.recorder.close()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def covers(self, regions):
+        bounds = self.bounds
+        return bounds is not None and region_contains(bounds, bounding_region(regions))
+
+    def retarget(self, regions):
+        """Grab only the bounding box of `regions` from now on; no regions pauses the grabber"""
+        bounds = bounding_region(regions) if regions else None
+        with self._condition:
+            if bounds == self.bounds:
+                return
+            if self.recorder:
+                raise RuntimeError("A recording grabber keeps the region set its log was opened with")
+            self.bounds = bounds
+            self._frames = [None] * len(self._frames)
+            self._condition.notify_all()
+
+    def latest(self):
+        with self._condition:
+            return self._take_newest()
+
+    def wait_newer(self, timestamp=None, timeout=1.0):
+        """Newest frame (after `timestamp` if given); None once the buffer has gone stale or on timeout"""
+        deadline = time.time() + timeout
+        with self._condition:
+            while True:
+                frame = self._newest()
+                if frame is not None and time.time() - frame.timestamp > self.max_age:
+                    # The grabber has stopped delivering; let the caller grab directly
+                    return None
+                if frame is not None and (timestamp is None or frame.timestamp > timestamp):
+                    self._last_read = self.frame_count
+                    return frame
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self.is_running():
+                    return None
+                self._condition.wait(remaining)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "frames": self.frame_count,
+                "dropped": self.dropped_frames,
+                "failures": self.failure_count,
+                "recorded": self.recorder.frame_count if self.recorder else 0,
+                "recorded_bytes": self.recorder.bytes_written if self.recorder else 0
+            }
+
+    def _newest(self):
+        if not self.frame_count:
+            return None
+        return self._frames[(self.frame_count - 1) % len(self._frames)]
+
+    def _take_newest(self):
+        self._last_read = self.frame_count
+        return self._newest()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            started = time.time()
+            bounds = self.bounds
+            if bounds is None:
+                self._stop_event.wait(self.interval)
+                continue
+            try:
+                img = _session.grab(bounds)
+                frame = FrameSnapshot(img, bounds["left"], bounds["top"], started)
+                with self._condition:
+                    if bounds != self.bounds:
+                        continue
+                    if self.frame_count and self._last_read < self.frame_count:
+                        self.dropped_frames += 1
+                    self._frames[self.frame_count % len(self._frames)] = frame
+                    self.frame_count += 1
+                    self._condition.notify_all()
+                if self.recorder:
+                    self.recorder.write(frame)
+            except Exception as e:
+                self.failure_count += 1
+                if self.failure_count == 1 or self.failure_count % 100 == 0:
+                    print(f"Background capture error: {e}")
+            self._stop_event.wait(max(0, self.interval - (time.time() - started)))
+
+_grabber = None
+
+def start_frame_grabber(regions, record_path=None):
+    global _grabber
+    stop_frame_grabber()
+    _grabber = FrameGrabber(regions, record_path=record_path).start()
+    return _grabber
+
+def stop_frame_grabber():
+    global _grabber
+    if _grabber:
+        _grabber.stop()
+        _grabber = None
+
+def capture_snapshot(regions, newer_than=None):
+    if _grabber and _grabber.is_running() and _grabber.covers(regions):
+        frame = _grabber.wait_newer(newer_than)
+        if frame is not None:
+            return frame
+    bounds = bounding_region(regions)
+    return FrameSnapshot(capture_region(bounds), bounds["left"], bounds["top"], _session.now())
+
+def capture_from(frame, region):
+    if frame is not None and frame.contains(region):
+        return frame.region(region)
+    return capture_region(region)
@@ -0,0 +1,97 @@
+import json
+from pathlib import Path
+from config import CLASSIFIER_FREQUENCY_PATH, CLASSIFIER_MIN_BOUND_TEMPLATES
+
+_classifiers = []
+_frequencies = {}
+
+class FrequencyClassifier:
+    """Scores a family's most often recorded template first and stops when no other template can beat it"""
+
+    def __init__(self, family, bank, threshold):
+        self.family = family
+        self.bank = bank
+        self.names = bank.names
+        self.threshold = threshold
+        self.calls = 0
+        self.scored = 0
+        self.early_exits = 0
+        self._guess = None
+        self._variants = {}
+        _classifiers.append(self)
+
+    def __len__(self):
+        return len(self.bank)
+
+    def with_threshold(self, threshold, min_similarity=None):
+        if min_similarity is None:
+            min_similarity = self.threshold
+        key = (threshold, min_similarity)
+        if key not in self._variants:
+            self._variants[key] = FrequencyClassifier(
+                f"{self.family}@{threshold}", self.bank.with_threshold(threshold), min_similarity
+            )
+        return self._variants[key]
+
+    def best_match(self, img):
+        if not self.names:
+            return None, 0
+        self.calls += 1
+        if len(self.names) < CLASSIFIER_MIN_BOUND_TEMPLATES:
+            self.scored += len(self.names)
+            return self.bank.best_match(img)
+        if self._guess is None:
+            counts = _frequencies.get(self.family, {})
+            self._guess = max(range(len(self.names)), key=lambda index: counts.get(self.names[index], 0))
+        guess = self._guess
+        gray, lower_bounds = self.bank.lower_bounds(img)
+        guess_sse = self.bank.subset_scores(gray, [guess])[0]
+        similarity = float(1 - guess_sse / self.bank._max_sse)
+
+        # Templates ahead of the guess win ties, so they only need to reach its score
+        contenders = lower_bounds < guess_sse
+        contenders[:guess] |= lower_bounds[:guess] == guess_sse
+        contenders[guess] = False
+        if similarity >= self.threshold and not contenders.any():
+            self.scored += 1
+            self.early_exits += 1
+            return self.names[guess], similarity
+        self.scored += len(self.names)
+        result = self.bank._result(self.bank._scores(gray))
+        return result.name, result.similarity
+
+    def record(self, name):
+        """Count a match the caller acted on; the most recorded template becomes the next guess"""
+        counts = _frequencies.setdefault(self.family, {})
+        counts[name] = counts.get(name, 0) + 1
+        if self._guess is not None and counts[name] > counts.get(self.names[self._guess], 0):
+            self._guess = self.names.index(name)
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "candidates": len(self.names),
+            "average_scored": self.scored / self.calls if self.calls else 0.0,
+            "early_exits": self.early_exits
+        }
+
+def classifier_stats():
+    return {classifier.family: classifier.stats() for classifier in _classifiers}
+
+def load_match_frequencies(path=CLASSIFIER_FREQUENCY_PATH):
+    if not Path(path).exists():
+        return
+    try:
+        with open(path, 'r') as f:
+            saved = json.load(f)
+        for family, counts in saved.items():
+            _frequencies[family] = {name: int(count) for name, count in counts.items()}
+    except Exception as e:
+        print(f"Ignoring saved match frequencies: {e}")
+
+def save_match_frequencies(path=CLASSIFIER_FREQUENCY_PATH):
+    try:
+        with open(path, 'w') as f:
+            json.dump(_frequencies, f, indent=2)
+    except Exception as e:
+        print(f"Could not save match frequencies: {e}")
@@ -1,6 +1,8 @@
 import json
+import os
 from pathlib import Path
 import sys
+from menu_model import MenuModel, MenuConfigError
 
 def get_resource_path(relative_path):
     try:
@@ -17,12 +19,35 @@ def get_exe_directory():
 
 ENABLE_HEALTH_MONITORING = True
 ENABLE_TRAINING_MENU = True
+# Records health bar fill percentages during matches, for calibrating HEALTH_BAR_REGIONS only
+ENABLE_GAUGE_TIMELINE = False
 
 MEDIA_FOLDER = get_resource_path("media")
 TRAINING_MENU_CONFIG_PATH = get_resource_path("training_menu_config.json")
+CAPTURE_CACHE_PATH = get_exe_directory() / "capture_cache.json"
+CLASSIFIER_FREQUENCY_PATH = get_exe_directory() / "match_frequencies.json"
+PLAYER_NAME_PATH = get_exe_directory() / "MyName.png"
+NAME_BANK_FOLDER = get_exe_directory() / "names"
+NAME_BANK_CACHE_PATH = get_exe_directory() / "name_bank_cache.npz"
 
 CHECK_INTERVAL = 1
+ENABLE_CAPTURE_THREAD = True
+CAPTURE_INTERVAL = 0.1
+CAPTURE_BUFFER_SIZE = 4
+CAPTURE_RECORD_PATH = os.environ.get("VAA_RECORD")
+CAPTURE_REPLAY_PATH = os.environ.get("VAA_REPLAY")
+ADD_NAME_ACCOUNT = bool(os.environ.get("VAA_ADD_ACCOUNT"))
+CAPTURE_REPLAY_REALTIME = os.environ.get("VAA_REPLAY_SPEED", "realtime") != "max"
+DETECTION_CACHE_SIZE = 64
+FINGERPRINT_MAX_SAMPLES = 1024
+AUDIO_CACHE_MAX_BYTES = 16 * 1024 * 1024
 VS_SCREEN_WAIT_TIME = 0.5
+WIZARD_STABILITY_TIMEOUT = 1.0
+STABILITY_SAMPLE_INTERVAL = 0.03
+STABILITY_REQUIRED_SAMPLES = 4
+STABILITY_TOLERANCE = 4
+STABILITY_SIGNATURE_SIZE = 8
+VS_EXTRACTION_WORKERS = 4
 COOLDOWN_PERIOD = 15
 MATCH_CHECK_INTERVAL = 2
 HEALTH_CHECK_INTERVAL = 0.3
@@ -31,6 +56,8 @@ HEALTH_CONFIRMATION_DELAY = 0.1
 MENU_CONFIRMATION_CHECKS = 3
 MENU_CONFIRMATION_DELAY = 0.5
 MATCH_END_CONFIRMATION_DELAY = 2
+GAUGE_TIMELINE_SIZE = 1024
+GAUGE_SAMPLE_INTERVAL = 0.03
 
 CONTROL_SIMILARITY_THRESHOLD = 0.98
 MIN_RANK_THRESHOLD = 0.80
@@ -38,7 +65,16 @@ MIN_DIVISION_THRESHOLD = 0.83
 MIN_MR_THRESHOLD = 0.90
 MIN_CHARACTER_THRESHOLD = 0.85
 NAME_THRESHOLD = 190
+IMAGE_THRESHOLD = 150
 CHARACTER_THRESHOLD = 210
+SIGNATURE_BLOCK_SIZE = 8
+SIGNATURE_SHORTLIST_SIZE = 4
+# Below this many templates one exhaustive Hamming pass beats the signature bounds
+# (benchmarks/bench_signature_index.py); the shipped character banks hold 28
+SIGNATURE_INDEX_MIN_TEMPLATES = 1000
+# Below this many templates a FrequencyClassifier scores every template instead of bounding
+# around its guess (benchmarks/bench_frequency_classifier.py); the shipped families hold at most 13
+CLASSIFIER_MIN_BOUND_TEMPLATES = 200
 
 CONTROL_REGIONS = [
     {"top": 834, "left": 56, "width": 35, "height": 31, "side": "left"},
@@ -70,6 +106,14 @@ HEALTH_REGIONS = [
     {"top": 73, "left": 1076, "width": 24, "height": 15, "side": "right"}
 ]
 
+# Full-bar strips for the gauge timeline only. Not yet calibrated against real
+# frames, so alerts still come from the yellow check on HEALTH_REGIONS and the
+# timeline stays off unless ENABLE_GAUGE_TIMELINE is set to collect readings
+HEALTH_BAR_REGIONS = [
+    {"top": 78, "left": 160, "width": 685, "height": 5, "side": "left"},
+    {"top": 78, "left": 1075, "width": 685, "height": 5, "side": "right"}
+]
+
 MR_REGIONS = [
     {"top": 993, "left": 38, "width": 14, "height": 23, "side": "left"},
     {"top": 993, "left": 1713, "width": 14, "height": 23, "side": "right"}
@@ -92,15 +136,21 @@ MR_VALUES = ["1000", "1100", "1200", "1300", "1400", "1500"]
 CONTROLS = ["Classic", "Modern"]
 
 training_menu_config = None
+training_menu_model = None
 
 def load_training_menu_config():
-    global training_menu_config
+    global training_menu_config, training_menu_model
     if not TRAINING_MENU_CONFIG_PATH.exists():
         return False
     try:
         with open(TRAINING_MENU_CONFIG_PATH, 'r') as f:
-            training_menu_config = json.load(f)
+            raw_config = json.load(f)
+        training_menu_model = MenuModel(raw_config)
+        training_menu_config = raw_config
         return True
+    except MenuConfigError as e:
+        print(f"Invalid training menu config: {e}")
+        return False
     except Exception as e:
         print(f"Error loading training menu config: {e}")
         return False
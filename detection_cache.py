@@ -0,0 +1,53 @@
+from collections import OrderedDict
+import numpy as np
+from config import DETECTION_CACHE_SIZE, FINGERPRINT_MAX_SAMPLES
+
+_caches = []
+
+def fingerprint(img, max_samples=FINGERPRINT_MAX_SAMPLES):
+    """Cheap identity of an ROI taken from a strided subsample of its pixels"""
+    h, w = img.shape[:2]
+    stride = max(1, int((h * w / max_samples) ** 0.5))
+    sample = np.ascontiguousarray(img[::stride, ::stride])
+    return hash((sample.shape, sample.tobytes()))
+
+class DetectionCache:
+    """Remembers the last detection result per ROI until the ROI's pixels change"""
+
+    def __init__(self, name, max_entries=DETECTION_CACHE_SIZE):
+        self.name = name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        _caches.append(self)
+
+    def lookup(self, key, img, detect):
+        img_fingerprint = fingerprint(img)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == img_fingerprint:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        self.misses += 1
+        result = detect()
+        self._entries[key] = (img_fingerprint, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+def cache_stats():
+    return {cache.name: cache.stats() for cache in _caches}
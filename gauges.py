@@ -0,0 +1,99 @@
+import numpy as np
+from capture import FrameSnapshot, bounding_region, capture_snapshot
+from image_processing import classify_colors, color_mask
+from config import HEALTH_BAR_REGIONS, GAUGE_TIMELINE_SIZE
+
+class Gauge:
+    __slots__ = ("name", "region", "colors")
+
+    def __init__(self, name, region, colors):
+        self.name = name
+        self.region = region
+        self.colors = colors
+
+def health_gauges():
+    gauges = []
+    for region in HEALTH_BAR_REGIONS:
+        base_color = "health_red" if region["side"] == "left" else "health_blue"
+        gauges.append(Gauge(f"health_{region['side']}", region, (base_color, "health_yellow")))
+    return gauges
+
+def fill_percentage(codes, colors):
+    """Share of the gauge's columns whose pixels are mostly in a fill color"""
+    filled = color_mask(codes, *colors)
+    filled_columns = np.count_nonzero(filled.mean(axis=0) >= 0.5)
+    return 100.0 * filled_columns / codes.shape[1]
+
+class GaugeTimeline:
+    """Fixed-size ring buffer of gauge readings; column 0 holds the timestamp"""
+
+    def __init__(self, names, capacity=GAUGE_TIMELINE_SIZE):
+        self.names = tuple(names)
+        self.capacity = capacity
+        self._samples = np.zeros((capacity, len(self.names) + 1))
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def append(self, timestamp, values):
+        row = self._samples[self._count % self.capacity]
+        row[0] = timestamp
+        row[1:] = values
+        self._count += 1
+
+    def latest(self):
+        if not self._count:
+            return None
+        row = self._samples[(self._count - 1) % self.capacity]
+        return dict(zip(self.names, row[1:].tolist()))
+
+    def window(self, seconds):
+        """Timestamps and readings of the last `seconds`, oldest first"""
+        indices = np.arange(self._count - len(self), self._count) % self.capacity
+        samples = self._samples[indices]
+        if len(samples):
+            samples = samples[samples[:, 0] >= samples[-1, 0] - seconds]
+        return samples[:, 0], samples[:, 1:]
+
+    def clear(self):
+        self._count = 0
+
+class GaugeSampler:
+    """Reads every gauge's fill percentage from one thin strip capture per tick"""
+
+    def __init__(self, gauges):
+        self.gauges = gauges
+        self.bounds = bounding_region([gauge.region for gauge in gauges])
+        self.timeline = GaugeTimeline([gauge.name for gauge in gauges])
+        self.sample_count = 0
+        self.first_sample_time = None
+        self.last_sample_time = None
+
+    def sample(self):
+        return self.read(capture_snapshot([self.bounds]))
+
+    def read(self, frame):
+        """Fill levels from the gauge strip of `frame`; None for a frame already sampled"""
+        if self.last_sample_time is not None and frame.timestamp <= self.last_sample_time:
+            return None
+        # Classify the strip once, not the whole frame; every gauge reads its slice of the codes
+        strip = frame.region(self.bounds)
+        codes = FrameSnapshot(classify_colors(strip), self.bounds["left"], self.bounds["top"], frame.timestamp)
+        levels = {gauge.name: fill_percentage(codes.region(gauge.region), gauge.colors) for gauge in self.gauges}
+        self.timeline.append(frame.timestamp, [levels[gauge.name] for gauge in self.gauges])
+        self.sample_count += 1
+        if self.first_sample_time is None:
+            self.first_sample_time = frame.timestamp
+        self.last_sample_time = frame.timestamp
+        return levels
+
+    def reset(self):
+        self.timeline.clear()
+
+    def stats(self):
+        elapsed = (self.last_sample_time or 0) - (self.first_sample_time or 0)
+        return {
+            "samples": self.sample_count,
+            "samples_per_second": (self.sample_count - 1) / elapsed if elapsed > 0 else 0.0
+        }
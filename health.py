@@ -1,108 +1,164 @@
-import time
-from capture import capture_region
-from image_processing import check_health_color
+import numpy as np
+from capture import capture_snapshot, capture_from
+from image_processing import check_health_colors, health_patch
 from audio import play_health_alert
+from detection_cache import DetectionCache
+from gauges import GaugeSampler, health_gauges
 from config import (
-    HEALTH_REGIONS, HEALTH_CHECK_INTERVAL, MATCH_CHECK_INTERVAL,
-    HEALTH_CONFIRMATION_CHECKS, HEALTH_CONFIRMATION_DELAY,
-    MATCH_END_CONFIRMATION_DELAY
+    HEALTH_REGIONS, HEALTH_CONFIRMATION_CHECKS, HEALTH_CONFIRMATION_DELAY, MATCH_END_CONFIRMATION_DELAY
 )
 
+_health_cache = DetectionCache("health")
+_health_sampler = GaugeSampler(health_gauges())
+
+# Scheduler and capture timestamps jitter by a few milliseconds; a reading this
+# close to HEALTH_CONFIRMATION_DELAY after the previous one still counts
+CONFIRMATION_TIME_TOLERANCE = 0.01
+
+class HealthConfirmation:
+    """Critical readings collected for one side across scheduler ticks before an alert fires"""
+    __slots__ = ("samples", "last_sample_time")
+
+    def __init__(self, sample_time):
+        self.samples = 1
+        self.last_sample_time = sample_time
+
+class HealthState:
+    __slots__ = ("alert_played", "confirmations", "match_end_check_pending", "match_end_check_time")
+
+    def __init__(self):
+        self.alert_played = {"left": False, "right": False}
+        self.confirmations = {"left": None, "right": None}
+        self.match_end_check_pending = False
+        self.match_end_check_time = 0
+
+    def confirming(self):
+        return any(self.confirmations.values())
+
+def classify_health(regions, health_imgs):
+    """Colors of several bars from their center patches, classified in one batch"""
+    patches = np.stack([health_patch(health_img) for health_img in health_imgs])
+    key = tuple(region["side"] for region in regions)
+    return _health_cache.lookup(key, patches, lambda: check_health_colors(patches))
+
 def check_match_started():
     try:
         p1_region = HEALTH_REGIONS[0]
-        health_img = capture_region(p1_region)
-        color = check_health_color(health_img)
+        health_img = capture_snapshot([p1_region]).region(p1_region)
+        color = classify_health([p1_region], [health_img])[0]
         if color == 'red':
             return True
     except Exception as e:
         print(f"Error checking match start: {e}")
     return False
 
-def check_health_bars(health_alert_states, match_end_check_pending, match_end_check_time):
+def confirm_critical_health(health_state, side, color, sample_time):
+    """Advance one side's confirmation window with a new reading; never blocks"""
+    confirmation = health_state.confirmations[side]
+    
+    if confirmation is None:
+        if color != 'yellow' or health_state.alert_played[side]:
+            return False
+        confirmation = HealthConfirmation(sample_time)
+        health_state.confirmations[side] = confirmation
+    elif sample_time - confirmation.last_sample_time < HEALTH_CONFIRMATION_DELAY - CONFIRMATION_TIME_TOLERANCE:
+        return False
+    elif color != 'yellow':
+        print(f"False positive filtered on {side.upper()} side (confirmation {confirmation.samples} failed: {color})")
+        health_state.confirmations[side] = None
+        return False
+    else:
+        confirmation.samples += 1
+        confirmation.last_sample_time = sample_time
+    
+    if confirmation.samples < HEALTH_CONFIRMATION_CHECKS:
+        return False
+    health_state.confirmations[side] = None
+    return True
+
+def record_health_gauges():
+    """Fill percentages go to the gauge timeline only; the bar geometry is not calibrated for alerts yet"""
+    try:
+        _health_sampler.sample()
+    except Exception as e:
+        print(f"Error sampling health bars: {e}")
+
+def check_health_bars(health_state, current_time):
     left_health_present = False
     right_health_present = False
     
-    for region in HEALTH_REGIONS:
+    try:
+        frame = capture_snapshot(HEALTH_REGIONS)
+    except Exception as e:
+        print(f"Error capturing health bars: {e}")
+        frame = None
+    # Confirmation spacing is measured between grabs, so a frame read twice counts once;
+    # match-end timing stays on the scheduler clock
+    sample_time = frame.timestamp if frame else current_time
+    
+    try:
+        colors = classify_health(HEALTH_REGIONS, [capture_from(frame, region) for region in HEALTH_REGIONS])
+    except Exception as e:
+        print(f"Error checking health bars: {e}")
+        colors = []
+    
+    for region, color in zip(HEALTH_REGIONS, colors):
         side = region["side"]
         try:
-            health_img = capture_region(region)
-            color = check_health_color(health_img)
-            
             if side == "left":
                 if color in ['red', 'yellow']:
                     left_health_present = True
                 if color in ['blue', 'yellow']:
                     right_health_present = True
             
-            if color == 'yellow':
-                confirmed = True
-                for i in range(HEALTH_CONFIRMATION_CHECKS - 1):
-                    time.sleep(HEALTH_CONFIRMATION_DELAY)
-                    health_img_confirm = capture_region(region)
-                    color_confirm = check_health_color(health_img_confirm)
-                    if color_confirm != 'yellow':
-                        confirmed = False
-                        print(f"False positive filtered on {side.upper()} side (confirmation {i+1} failed: {color_confirm})")
-                        break
-                
-                if confirmed and not health_alert_states[side]["alert_played"]:
+            if health_state.confirmations[side] is not None or color == 'yellow':
+                if confirm_critical_health(health_state, side, color, sample_time):
                     print(f"\nCritical health CONFIRMED on {side.upper()} side!")
                     play_health_alert(side)
-                    health_alert_states[side]["alert_played"] = True
+                    health_state.alert_played[side] = True
             else:
                 base_color = 'red' if side == 'left' else 'blue'
                 if color == base_color:
-                    if health_alert_states[side]["alert_played"]:
+                    if health_state.alert_played[side]:
                         print(f"Health reset detected on {side.upper()} side - ready for next alert")
-                        health_alert_states[side]["alert_played"] = False
+                        health_state.alert_played[side] = False
         except Exception as e:
             print(f"Error checking {side} health bar: {e}")
     
     if left_health_present or right_health_present:
-        if match_end_check_pending:
+        if health_state.match_end_check_pending:
             print("Health bars detected again - match still active")
-            match_end_check_pending = False
-        return False, match_end_check_pending, match_end_check_time
+            health_state.match_end_check_pending = False
+        return False
     
-    if not match_end_check_pending:
-        match_end_check_pending = True
-        match_end_check_time = time.time()
+    if not health_state.match_end_check_pending:
+        health_state.match_end_check_pending = True
+        health_state.match_end_check_time = current_time
         print(f"Health bars not detected - confirming match end over {MATCH_END_CONFIRMATION_DELAY} seconds...")
-    elif time.time() - match_end_check_time >= MATCH_END_CONFIRMATION_DELAY:
+    elif current_time - health_state.match_end_check_time >= MATCH_END_CONFIRMATION_DELAY:
         print("\nMatch ended - Health monitoring deactivated\n")
-        return True, match_end_check_pending, match_end_check_time
+        return True
     
-    return False, match_end_check_pending, match_end_check_time
+    return False
 
-def handle_health_monitoring(current_time, health_state):
-    if not health_state['active']:
-        if current_time - health_state['last_match_check_time'] >= MATCH_CHECK_INTERVAL:
-            if check_match_started():
-                print("\n" + "="*60)
-                print("MATCH STARTED - Health monitoring activated")
-                print("="*60 + "\n")
-                health_state['active'] = True
-                health_state['last_health_check_time'] = current_time
-                health_state['last_match_check_time'] = current_time
-                return 'vs_screen'
-            health_state['last_match_check_time'] = current_time
-    else:
-        if current_time - health_state['last_health_check_time'] >= HEALTH_CHECK_INTERVAL:
-            match_ended, pending, end_time = check_health_bars(
-                health_state['alert_states'],
-                health_state['match_end_check_pending'],
-                health_state['match_end_check_time']
-            )
-            health_state['match_end_check_pending'] = pending
-            health_state['match_end_check_time'] = end_time
-            
-            if match_ended:
-                health_state['active'] = False
-                health_state['alert_states']["left"]["alert_played"] = False
-                health_state['alert_states']["right"]["alert_played"] = False
-                health_state['match_end_check_pending'] = False
-                return 'idle'
-            health_state['last_health_check_time'] = current_time
-    
+def handle_match_start(current_time, health_state):
+    if check_match_started():
+        print("\n" + "="*60)
+        print("MATCH STARTED - Health monitoring activated")
+        print("="*60 + "\n")
+        return 'match_started'
     return None
+
+def handle_health_check(current_time, health_state):
+    if check_health_bars(health_state, current_time):
+        health_state.alert_played["left"] = False
+        health_state.alert_played["right"] = False
+        health_state.confirmations["left"] = None
+        health_state.confirmations["right"] = None
+        health_state.match_end_check_pending = False
+        _health_sampler.reset()
+        return 'match_ended'
+    return None
+
+def health_sampler_stats():
+    return _health_sampler.stats()
@@ -1,6 +1,6 @@
 import cv2
 import numpy as np
-from config import NAME_THRESHOLD, CHARACTER_THRESHOLD
+from config import SIGNATURE_BLOCK_SIZE, SIGNATURE_SHORTLIST_SIZE, SIGNATURE_INDEX_MIN_TEMPLATES
 
 def load_image_from_path(image_path):
     if not image_path.exists():
@@ -22,57 +22,6 @@ def load_image(image_path):
         img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
     return img
 
-def compare_images(img1, img2):
-    if img1.shape != img2.shape:
-        img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
-    gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-    gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-    _, gray1 = cv2.threshold(gray1, 150, 255, cv2.THRESH_BINARY)
-    _, gray2 = cv2.threshold(gray2, 150, 255, cv2.THRESH_BINARY)
-    mse = np.mean((gray1.astype(float) - gray2.astype(float)) ** 2)
-    max_mse = 255 ** 2
-    similarity = 1 - (mse / max_mse)
-    return similarity
-
-def compare_images_no_threshold(img1, img2):
-    if img1.shape != img2.shape:
-        img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
-    gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-    gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-    mse = np.mean((gray1.astype(float) - gray2.astype(float)) ** 2)
-    max_mse = 255 ** 2
-    similarity = 1 - (mse / max_mse)
-    return similarity
-
-def compare_names(img1, img2):
-    if img1.shape != img2.shape:
-        img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
-    
-    gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-    _, binary2 = cv2.threshold(gray2, NAME_THRESHOLD, 255, cv2.THRESH_BINARY)
-    
-    mse = np.mean((img1.astype(float) - binary2.astype(float)) ** 2)
-    max_mse = 255 ** 2
-    similarity = 1 - (mse / max_mse)
-    return similarity
-
-def compare_characters(img1, img2):
-    """Compare character images using binary threshold at 215"""
-    if img1.shape != img2.shape:
-        img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
-    
-    # Convert both to grayscale and apply same threshold
-    gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-    gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-    
-    _, binary1 = cv2.threshold(gray1, CHARACTER_THRESHOLD, 255, cv2.THRESH_BINARY)
-    _, binary2 = cv2.threshold(gray2, CHARACTER_THRESHOLD, 255, cv2.THRESH_BINARY)
-    
-    mse = np.mean((binary1.astype(float) - binary2.astype(float)) ** 2)
-    max_mse = 255 ** 2
-    similarity = 1 - (mse / max_mse)
-    return similarity
-
 def compare_images_grayscale(img1, img2, threshold=0.90):
     if img1.shape != img2.shape:
         img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
@@ -91,6 +40,37 @@ def apply_binary_threshold(img, threshold=230):
 def check_for_white_pixels(img, threshold=200):
     return np.any(img > threshold)
 
+# Inclusive BGR ranges of every color a detector looks for
+COLOR_RANGES = {
+    "health_red": ((93, 26, 215), (97, 30, 220)),
+    "health_yellow": ((105, 246, 250), (110, 250, 253)),
+    "health_blue": ((184, 105, 12), (188, 110, 15)),
+    "control_modern": ((0, 25, 90), (35, 70, 165)),
+    "control_classic": ((100, 0, 45), (140, 12, 95)),
+    "option_yellow": ((50, 200, 200), (120, 255, 255)),
+}
+
+COLOR_BITS = {name: 1 << index for index, name in enumerate(COLOR_RANGES)}
+
+def build_color_table(color_ranges):
+    """One bitmask per channel value; a pixel is in a color when all three channels agree"""
+    table = np.zeros((3, 256), dtype=np.uint16)
+    for name, (lower, upper) in color_ranges.items():
+        for channel in range(3):
+            table[channel, lower[channel]:upper[channel] + 1] |= COLOR_BITS[name]
+    return table
+
+COLOR_TABLE = build_color_table(COLOR_RANGES)
+
+def classify_colors(img):
+    return COLOR_TABLE[0][img[..., 0]] & COLOR_TABLE[1][img[..., 1]] & COLOR_TABLE[2][img[..., 2]]
+
+def color_mask(codes, *names):
+    bits = 0
+    for name in names:
+        bits |= COLOR_BITS[name]
+    return (codes & bits) != 0
+
 def check_control_color(img):
     h, w = img.shape[:2]
     center_y = h // 2
@@ -103,19 +83,9 @@ def check_control_color(img):
     
     total_pixels = center.shape[0] * center.shape[1]
     
-    modern_mask = (
-        (center[:,:,0] >= 0) & (center[:,:,0] <= 35) &
-        (center[:,:,1] >= 25) & (center[:,:,1] <= 70) &
-        (center[:,:,2] >= 90) & (center[:,:,2] <= 165)
-    )
-    modern_matches = np.sum(modern_mask)
-    
-    classic_mask = (
-        (center[:,:,0] >= 100) & (center[:,:,0] <= 140) &
-        (center[:,:,1] >= 0) & (center[:,:,1] <= 12) &
-        (center[:,:,2] >= 45) & (center[:,:,2] <= 95)
-    )
-    classic_matches = np.sum(classic_mask)
+    codes = classify_colors(center)
+    modern_matches = np.count_nonzero(color_mask(codes, "control_modern"))
+    classic_matches = np.count_nonzero(color_mask(codes, "control_classic"))
     
     center_pixel = center[1, 1]
     print(f"  [Color check: BGR={center_pixel}, Modern={modern_matches}/{total_pixels}, Classic={classic_matches}/{total_pixels}]")
@@ -130,38 +100,283 @@ def check_control_color(img):
     print(f"  [Color detection failed: neither threshold met (need {threshold:.1f})]")
     return None
 
-def check_health_color(img):
+def health_patch(img):
     h, w = img.shape[:2]
-    center = img[h//2-3:h//2+4, w//2-3:w//2+4]
-    total_pixels = center.shape[0] * center.shape[1]
-    
-    red_mask = (
-        (center[:,:,2] >= 215) & (center[:,:,2] <= 220) & 
-        (center[:,:,1] >= 26) & (center[:,:,1] <= 30) & 
-        (center[:,:,0] >= 93) & (center[:,:,0] <= 97)
-    )
-    red_matches = np.sum(red_mask)
-    
-    yellow_mask = (
-        (center[:,:,2] >= 250) & (center[:,:,2] <= 253) & 
-        (center[:,:,1] >= 246) & (center[:,:,1] <= 250) & 
-        (center[:,:,0] >= 105) & (center[:,:,0] <= 110)
-    )
-    yellow_matches = np.sum(yellow_mask)
-    
-    blue_mask = (
-        (center[:,:,2] >= 12) & (center[:,:,2] <= 15) & 
-        (center[:,:,1] >= 105) & (center[:,:,1] <= 110) & 
-        (center[:,:,0] >= 184) & (center[:,:,0] <= 188)
-    )
-    blue_matches = np.sum(blue_mask)
-    
-    threshold = total_pixels * 0.8
+    return img[h//2-3:h//2+4, w//2-3:w//2+4]
+
+def check_health_colors(patches):
+    """Color of each stacked health bar patch, all classified in one lookup"""
+    codes = classify_colors(patches).reshape(len(patches), -1)
+    threshold = codes.shape[1] * 0.8
+    red_matches = np.count_nonzero(color_mask(codes, "health_red"), axis=1)
+    yellow_matches = np.count_nonzero(color_mask(codes, "health_yellow"), axis=1)
+    blue_matches = np.count_nonzero(color_mask(codes, "health_blue"), axis=1)
     
-    if red_matches >= threshold:
-        return 'red'
-    elif yellow_matches >= threshold:
-        return 'yellow'
-    elif blue_matches >= threshold:
-        return 'blue'
-    return None
+    colors = []
+    for red, yellow, blue in zip(red_matches, yellow_matches, blue_matches):
+        if red >= threshold:
+            colors.append('red')
+        elif yellow >= threshold:
+            colors.append('yellow')
+        elif blue >= threshold:
+            colors.append('blue')
+        else:
+            colors.append(None)
+    return colors
+
+POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+BIT_WEIGHTS = np.array([128, 64, 32, 16, 8, 4, 2, 1], dtype=np.uint8)
+BIT_SUM = np.ones(8, dtype=np.uint8)
+
+class MatchResult:
+    """Best and runner-up template for one ROI; margin is how far apart they scored"""
+    __slots__ = ("name", "similarity", "runner_up", "runner_up_similarity")
+
+    def __init__(self, name, similarity, runner_up, runner_up_similarity):
+        self.name = name
+        self.similarity = similarity
+        self.runner_up = runner_up
+        self.runner_up_similarity = runner_up_similarity
+
+    @property
+    def margin(self):
+        return self.similarity - self.runner_up_similarity
+
+class TemplateBank:
+    """Reference images of one family, resized to their screen region and preprocessed once"""
+
+    def __init__(self, images, region, threshold=None):
+        self.names = list(images)
+        self.size = (region["width"], region["height"])
+        self.threshold = threshold
+        templates = np.empty((len(self.names), region["height"], region["width"]), dtype=np.uint8)
+        for index, name in enumerate(self.names):
+            templates[index] = self.prepare(images[name])
+        self._variants = {}
+        self._compile(templates)
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_packed(cls, names, region, threshold, packed):
+        """Rebuild a binarized bank from bits saved by an earlier run, without decoding any image"""
+        bank = cls({}, region, threshold)
+        bank.names = list(names)
+        height, width = region["height"], region["width"]
+        bank._compile(np.unpackbits(packed, axis=1, count=height * width).reshape(len(bank.names), height, width) * 255)
+        return bank
+
+    def _compile(self, templates):
+        n, h, w = templates.shape
+        self._compile_signatures(templates)
+        self._resized = np.empty((h, w, 3), dtype=np.uint8)
+        self._gray = np.empty((h, w), dtype=np.uint8)
+        self._sse = np.empty(n, dtype=np.int64)
+        self._max_sse = h * w * 255 ** 2
+        if self.threshold is None:
+            # SSE expands to |t|^2 - 2 t.l + |l|^2, so scoring is one integer
+            # matrix-vector product into preallocated buffers; int64 holds any region's sum
+            self.templates = templates
+            self.packed = None
+            self._reference = templates.reshape(n, h * w).astype(np.int64)
+            self._reference_norms = np.einsum("ni,ni->n", self._reference, self._reference)
+            self._live = np.empty(h * w, dtype=np.int64)
+        else:
+            # Binarized pixels are 0 or 255, so the squared error of a pixel is
+            # either 0 or 255**2 and the SSE is the Hamming distance times 255**2
+            self.templates = None
+            self.packed = np.packbits(templates.reshape(n, h * w), axis=1)
+            # The live ROI is packed by masking each pixel with its bit's weight and
+            # summing every 8; OpenCV then XORs, counts and sums rows in place
+            self._bit_weights = np.tile(BIT_WEIGHTS, self.packed.shape[1])[:h * w]
+            self._bits = np.zeros((self.packed.shape[1], 8), dtype=np.uint8)
+            self._live_packed = np.empty((1, self.packed.shape[1]), dtype=np.uint8)
+            self._xor = np.empty_like(self.packed)
+            self._bit_counts = np.empty((n, 1), dtype=np.int32)
+
+    def _compile_signatures(self, templates):
+        n, h, w = templates.shape
+        self._cells = (-(-h // SIGNATURE_BLOCK_SIZE), -(-w // SIGNATURE_BLOCK_SIZE))
+        self._padded = np.zeros((self._cells[0] * SIGNATURE_BLOCK_SIZE, self._cells[1] * SIGNATURE_BLOCK_SIZE), dtype=np.uint8)
+        padded = np.zeros((n,) + self._padded.shape, dtype=np.uint8)
+        padded[:, :h, :w] = templates
+        cells = padded.reshape(n, self._cells[0], SIGNATURE_BLOCK_SIZE, self._cells[1], SIGNATURE_BLOCK_SIZE)
+        self._signatures = cells.sum(axis=(2, 4), dtype=np.int64).reshape(n, self._cells[0] * self._cells[1])
+        if self.threshold is not None:
+            # Binarized blocks are summarized by their set-pixel count, which fits in int16
+            self._signatures = (self._signatures // 255).astype(np.int16)
+
+    def _signature(self, gray):
+        """Pixel sum of every SIGNATURE_BLOCK_SIZE block, or its set-pixel count once binarized; zero-padded at the edges"""
+        h, w = gray.shape
+        self._padded[:h, :w] = gray
+        cells = self._padded.reshape(self._cells[0], SIGNATURE_BLOCK_SIZE, self._cells[1], SIGNATURE_BLOCK_SIZE)
+        sums = cells.sum(axis=(1, 3), dtype=np.int32).ravel()
+        if self.threshold is not None:
+            return (sums // 255).astype(np.int16)
+        return sums
+
+    def prepare(self, img):
+        if img.shape[:2] != (self.size[1], self.size[0]):
+            img = cv2.resize(img, self.size)
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        if self.threshold is not None:
+            _, gray = cv2.threshold(gray, self.threshold, 255, cv2.THRESH_BINARY)
+        return gray
+
+    def _prepare_into(self, img):
+        if img.shape[:2] != self._gray.shape:
+            img = cv2.resize(img, self.size, dst=self._resized if img.ndim == 3 else self._gray)
+        if img.ndim == 3:
+            cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        else:
+            np.copyto(self._gray, img)
+        if self.threshold is not None:
+            cv2.threshold(self._gray, self.threshold, 255, cv2.THRESH_BINARY, dst=self._gray)
+        return self._gray
+
+    def with_threshold(self, threshold):
+        if self.threshold is not None:
+            raise ValueError("Template bank is already binarized")
+        if threshold not in self._variants:
+            region = {"width": self.size[0], "height": self.size[1]}
+            variant = TemplateBank({}, region, threshold)
+            variant.names = self.names
+            variant._compile(np.where(self.templates > threshold, 255, 0).astype(np.uint8))
+            self._variants[threshold] = variant
+        return self._variants[threshold]
+
+    def scores(self, img):
+        """Sum of squared differences between the ROI and every template, in one pass"""
+        return self._scores(self._prepare_into(img))
+
+    def batch_similarities(self, imgs):
+        """Similarity of several ROIs to every template; one row per ROI"""
+        if self.packed is None:
+            sse = np.array([self.scores(img).copy() for img in imgs])
+        else:
+            live = np.array([self._pack(self._prepare_into(img)).copy() for img in imgs])
+            distances = POPCOUNT_TABLE[np.bitwise_xor(live[:, None, :], self.packed[None, :, :])]
+            sse = distances.sum(axis=2, dtype=np.int64) * 255 ** 2
+        return np.maximum(1 - sse / self._max_sse, 0)
+
+    def lower_bounds(self, img):
+        """Prepared ROI and a lower bound on its SSE against every template, from block sums alone"""
+        gray = self._prepare_into(img)
+        differences = self._signatures - self._signature(gray)
+        if self.packed is not None:
+            # A block differs in at least as many pixels as its set-pixel counts differ
+            return gray, np.abs(differences).sum(axis=1, dtype=np.int64) * 255 ** 2
+        # Cauchy-Schwarz: a block's squared error is at least its squared sum difference over its area
+        return gray, (differences * differences // SIGNATURE_BLOCK_SIZE ** 2).sum(axis=1)
+
+    def subset_scores(self, gray, indices):
+        """Exact SSE of a prepared ROI against a few templates"""
+        if self.packed is not None:
+            rows = cv2.LUT(np.bitwise_xor(self.packed[indices], self._pack(gray)), POPCOUNT_TABLE)
+            return cv2.reduce(rows, 1, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel().astype(np.int64) * 255 ** 2
+        diff = self._reference[indices] - gray.reshape(-1)
+        return np.einsum("ni,ni->n", diff, diff)
+
+    def _pack(self, gray):
+        """np.packbits of a binarized ROI, written into the bank's own buffer"""
+        bits = self._bits.reshape(-1)[:gray.size]
+        np.bitwise_and(gray.reshape(-1), self._bit_weights, out=bits)
+        return np.matmul(self._bits, BIT_SUM, out=self._live_packed[0])
+
+    def _scores(self, gray):
+        if self.packed is not None:
+            self._pack(gray)
+            cv2.repeat(self._live_packed, len(self.packed), 1, dst=self._xor)
+            cv2.bitwise_xor(self.packed, self._xor, dst=self._xor)
+            cv2.LUT(self._xor, POPCOUNT_TABLE, dst=self._xor)
+            cv2.reduce(self._xor, 1, cv2.REDUCE_SUM, dst=self._bit_counts, dtype=cv2.CV_32S)
+            np.copyto(self._sse, self._bit_counts.reshape(-1))
+            return np.multiply(self._sse, 255 ** 2, out=self._sse)
+        np.copyto(self._live, gray.reshape(-1))
+        np.matmul(self._reference, self._live, out=self._sse)
+        np.multiply(self._sse, -2, out=self._sse)
+        np.add(self._sse, self._reference_norms, out=self._sse)
+        return np.add(self._sse, np.matmul(self._live, self._live), out=self._sse)
+
+    def match(self, img):
+        if not self.names:
+            return MatchResult(None, 0, None, 0)
+        return self._result(self.scores(img))
+
+    def _result(self, sse):
+        best_index = int(np.argmin(sse))
+        best_similarity = 1 - sse[best_index] / self._max_sse
+        runner_up = None
+        runner_up_similarity = 0
+        if len(self.names) > 1:
+            best_sse = sse[best_index]
+            sse[best_index] = self._max_sse + 1
+            runner_up_index = int(np.argmin(sse))
+            sse[best_index] = best_sse
+            runner_up = self.names[runner_up_index]
+            runner_up_similarity = 1 - sse[runner_up_index] / self._max_sse
+        if best_similarity <= 0:
+            return MatchResult(None, 0, None, 0)
+        return MatchResult(self.names[best_index], float(best_similarity), runner_up, float(runner_up_similarity))
+
+    def best_match(self, img):
+        result = self.match(img)
+        return result.name, result.similarity
+
+class SignatureIndex:
+    """Coarse-to-fine search over a binarized TemplateBank, exact but scoring only a shortlist"""
+
+    def __init__(self, bank, shortlist_size=SIGNATURE_SHORTLIST_SIZE):
+        if bank.packed is None:
+            raise ValueError("Signature index needs a binarized template bank")
+        self.bank = bank
+        self.names = bank.names
+        self.shortlist_size = max(2, shortlist_size)
+        self.scored = 0
+        self.searches = 0
+        self._sse = np.empty(len(bank), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.bank)
+
+    def match(self, img):
+        if not self.names:
+            return MatchResult(None, 0, None, 0)
+        gray, lower_bounds = self.bank.lower_bounds(img)
+        order = np.argsort(lower_bounds, kind="stable")
+
+        # Score candidates in order of their lower bound until no unscored one
+        # can reach the runner-up, so the result equals an exhaustive search
+        self._sse.fill(self.bank._max_sse + 1)
+        scored = 0
+        shortlist_size = self.shortlist_size
+        while scored < len(order):
+            shortlist = order[scored:scored + shortlist_size]
+            self._sse[shortlist] = self.bank.subset_scores(gray, shortlist)
+            scored += len(shortlist)
+            if scored < len(order) and lower_bounds[order[scored]] > np.partition(self._sse, 1)[1]:
+                break
+            # Each round that fails to stop doubles the next shortlist, bounding the rounds by log2(N)
+            shortlist_size *= 2
+        self.scored += scored
+        self.searches += 1
+        return self.bank._result(self._sse)
+
+    def best_match(self, img):
+        result = self.match(img)
+        return result.name, result.similarity
+
+    @classmethod
+    def for_bank(cls, bank):
+        """An index over a binarized bank large enough for the bounds to pay off, else the bank itself"""
+        if bank.packed is not None and len(bank) >= SIGNATURE_INDEX_MIN_TEMPLATES:
+            return cls(bank)
+        return bank
+
+    def stats(self):
+        return {
+            "templates": len(self.bank),
+            "average_scored": self.scored / self.searches if self.searches else 0.0
+        }
@@ -0,0 +1,238 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+SUBMENU_INDICATOR_REGION = {"top": 35, "left": 877, "width": 13, "height": 14}
+
+RECORD_TAB_CHECK_LEFT = 738
+CHARACTER_SELECT_CHECK_LEFT = 449
+CHARACTER_SELECT_ITEMS = ("P1 Character Select", "P2 Character Select")
+
+DETECTION_METHODS = ("yellow_width", "image_comparison")
+
+MenuItem = namedtuple("MenuItem", ["key", "name", "row", "check_region", "value_region", "option"])
+MenuTab = namedtuple("MenuTab", ["name", "number", "is_submenu", "items", "sub_tabs", "sub_tab_positions"])
+
+class MenuConfigError(ValueError):
+    pass
+
+def name_to_audio_file(name, extension):
+    return f"{name.lower().replace(' ', '_').replace('-', '_')}{extension}"
+
+def _region(top, left, width, height):
+    return MappingProxyType({"top": top, "left": left, "width": width, "height": height})
+
+def _frozen_region(region, context):
+    try:
+        return _region(int(region["top"]), int(region["left"]), int(region["width"]), int(region["height"]))
+    except (KeyError, TypeError, ValueError):
+        raise MenuConfigError(f"{context}: region needs integer top, left, width and height")
+
+def _tab_segments(tab_region, num_tabs):
+    segment_width = tab_region["width"] / num_tabs
+    segments = []
+    for i in range(num_tabs):
+        x_start = int(i * segment_width + segment_width * 0.3)
+        x_end = int(i * segment_width + segment_width * 0.7)
+        segments.append(_region(tab_region["top"], tab_region["left"] + x_start, max(0, x_end - x_start), tab_region["height"]))
+    return tuple(segments)
+
+class MenuModel:
+    """Training menu layout compiled once from training_menu_config.json into read-only lookups"""
+
+    def __init__(self, raw_config):
+        try:
+            self._compile(raw_config)
+        except MenuConfigError:
+            raise
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            raise MenuConfigError(f"Malformed training menu config: missing or invalid {e}") from e
+
+    def tab_by_number(self, tab_number, is_submenu=False):
+        tabs = self._submenu_tabs_by_number if is_submenu else self._tabs_by_number
+        return tabs.get(tab_number)
+
+    def tab(self, tab_name, is_submenu=False):
+        return (self.submenu_tabs if is_submenu else self.tabs).get(tab_name)
+
+    def items(self, tab_name, sub_tab_name=None, is_submenu=False):
+        tab = self.tab(tab_name, is_submenu)
+        if tab is None:
+            return ()
+        if tab.sub_tabs is not None:
+            return tab.sub_tabs.get(sub_tab_name, ())
+        return tab.items
+
+    def audio_file(self, name):
+        audio_file = self._audio_files.get(name)
+        if audio_file is None:
+            audio_file = name_to_audio_file(name, self.audio_extension)
+        return audio_file
+
+    def _compile(self, raw):
+        self.settings = MappingProxyType(dict(raw["detection_settings"]))
+        for key in ("menu_check_interval", "menu_match_threshold", "binary_threshold",
+                    "white_pixel_threshold", "submenu_match_threshold", "yellow_width_tolerance"):
+            if not isinstance(self.settings[key], (int, float)):
+                raise MenuConfigError(f"detection_settings.{key} must be a number")
+
+        self.option_definitions = MappingProxyType({
+            key: MappingProxyType(dict(definition)) for key, definition in raw["option_definitions"].items()
+        })
+        for key, definition in self.option_definitions.items():
+            if "audio" not in definition:
+                raise MenuConfigError(f"Option definition '{key}' has no audio file")
+
+        self.tab_region = _frozen_region(raw["tab_detection"]["region"], "tab_detection")
+        self.num_tabs = int(raw["tab_detection"]["num_tabs"])
+        self.menu_reference_image = raw["tab_detection"]["reference_image"]
+        self.submenu_tab_region = _frozen_region(raw["submenu_detection"]["tab_region"], "submenu_detection")
+        self.submenu_num_tabs = int(raw["submenu_detection"]["num_tabs"])
+        self.submenu_reference_image = raw["submenu_detection"]["reference_image"]
+        if self.num_tabs < 1 or self.submenu_num_tabs < 1:
+            raise MenuConfigError("num_tabs must be at least 1")
+        self.tab_segments = _tab_segments(self.tab_region, self.num_tabs)
+        self.submenu_tab_segments = _tab_segments(self.submenu_tab_region, self.submenu_num_tabs)
+        self.audio_extension = raw["audio"]["extension"]
+
+        item_detection = raw["item_detection"]
+        self.positions = tuple(int(item_y) for item_y in item_detection["positions"])
+        self.check_region = MappingProxyType(dict(item_detection["check_region"]))
+        self.value_region_template = MappingProxyType(dict(item_detection["value_region"]))
+
+        self._audio_files = {}
+        self.tabs = MappingProxyType(self._compile_tabs(raw["tabs"], False))
+        self.submenu_tabs = MappingProxyType(self._compile_tabs(raw["submenu_tabs"], True))
+        self._tabs_by_number = self._index_by_number(self.tabs, self.num_tabs, "tabs")
+        self._submenu_tabs_by_number = self._index_by_number(self.submenu_tabs, self.submenu_num_tabs, "submenu_tabs")
+
+        self.option_items = tuple(
+            item
+            for tabs in (self.tabs, self.submenu_tabs)
+            for tab in tabs.values()
+            for items in ((tab.items,) if tab.sub_tabs is None else tab.sub_tabs.values())
+            for item in items
+            if item.option is not None
+        )
+        self.panel_regions = self._collect_panel_regions()
+
+    def _compile_tabs(self, raw_tabs, is_submenu):
+        tabs = {}
+        for tab_name, tab_data in raw_tabs.items():
+            context = f"{'submenu tab' if is_submenu else 'tab'} '{tab_name}'"
+            item_options = tab_data.get("item_options", {})
+            self._audio_files[tab_name] = name_to_audio_file(tab_name, self.audio_extension)
+
+            sub_tabs = None
+            sub_tab_positions = ()
+            if not is_submenu and tab_data.get("has_sub_tabs", False):
+                if "sub_tabs" not in tab_data:
+                    raise MenuConfigError(f"{context} has_sub_tabs but defines no sub_tabs")
+                sub_tabs = MappingProxyType({
+                    sub_tab_name: self._compile_items(tab_name, sub_tab_name, item_names, tab_data, item_options, is_submenu)
+                    for sub_tab_name, item_names in tab_data["sub_tabs"].items()
+                })
+                for sub_tab_name in sub_tabs:
+                    self._audio_files[sub_tab_name] = name_to_audio_file(sub_tab_name, self.audio_extension)
+                if "sub_tab_detection" in tab_data:
+                    positions = []
+                    for sub_tab_info in tab_data["sub_tab_detection"]["positions"]:
+                        if sub_tab_info["name"] not in sub_tabs:
+                            raise MenuConfigError(f"{context}: sub-tab position '{sub_tab_info['name']}' is not a sub_tab")
+                        region = dict(_frozen_region(sub_tab_info, context))
+                        region["name"] = sub_tab_info["name"]
+                        positions.append(MappingProxyType(region))
+                    sub_tab_positions = tuple(positions)
+                items = ()
+            else:
+                items = self._compile_items(tab_name, None, tab_data.get("items", []), tab_data, item_options, is_submenu)
+
+            known_items = set(item.name for item in items)
+            for sub_items in (sub_tabs or {}).values():
+                known_items.update(item.name for item in sub_items)
+            for item_name in item_options:
+                if item_name not in known_items:
+                    raise MenuConfigError(f"{context}: item_options entry '{item_name}' is not a menu item")
+
+            tabs[tab_name] = MenuTab(tab_name, int(tab_data["tab_number"]), is_submenu, items, sub_tabs, sub_tab_positions)
+        return tabs
+
+    def _compile_items(self, tab_name, sub_tab_name, item_names, tab_data, item_options, is_submenu):
+        context = f"'{tab_name}'" + (f" > '{sub_tab_name}'" if sub_tab_name else "")
+        start_position = int(tab_data["start_position"])
+        items = []
+        for index, item_name in enumerate(item_names):
+            if item_name is None:
+                continue
+            row = start_position + index - 1
+            if not 0 <= row < len(self.positions):
+                raise MenuConfigError(f"{context}: item '{item_name}' falls outside item_detection.positions")
+            item_y = self.positions[row]
+            option = self._compile_option(item_options[item_name], f"{context} > '{item_name}'") if item_name in item_options else None
+
+            if is_submenu and tab_name == "Record":
+                check_left = RECORD_TAB_CHECK_LEFT
+            elif tab_name == "Environment Settings" and item_name in CHARACTER_SELECT_ITEMS:
+                check_left = CHARACTER_SELECT_CHECK_LEFT
+            else:
+                check_left = self.check_region["left"]
+            check_region = _region(item_y, check_left, self.check_region["width"], self.check_region["height"])
+
+            if option is not None and "value_region_override" in option:
+                value_region = option["value_region_override"]
+            else:
+                value_template = self.value_region_template
+                value_region = _region(
+                    item_y + value_template["top_offset"], value_template["left"],
+                    value_template["width"], value_template["height"]
+                )
+
+            self._audio_files[item_name] = name_to_audio_file(item_name, self.audio_extension)
+            key = (is_submenu, tab_name, sub_tab_name, item_name)
+            items.append(MenuItem(key, item_name, row, check_region, value_region, option))
+        return tuple(items)
+
+    def _compile_option(self, option_config, context):
+        option = dict(option_config)
+        option["options"] = tuple(option_config["options"])
+        if not option["options"]:
+            raise MenuConfigError(f"{context}: no options listed")
+        if option["detection_method"] not in DETECTION_METHODS:
+            raise MenuConfigError(f"{context}: unknown detection_method '{option['detection_method']}'")
+        for option_key in option["options"]:
+            if option_key not in self.option_definitions:
+                raise MenuConfigError(f"{context}: option '{option_key}' has no definition")
+
+        default_key = option.get("default", option["options"][0])
+        if default_key not in self.option_definitions:
+            raise MenuConfigError(f"{context}: default option '{default_key}' has no definition")
+        if option["detection_method"] == "yellow_width":
+            for option_key in option["options"]:
+                if option_key != default_key and "width" not in self.option_definitions[option_key]:
+                    raise MenuConfigError(f"{context}: option '{option_key}' needs a width for yellow_width detection")
+        elif not any("image" in self.option_definitions[option_key] for option_key in option["options"]):
+            raise MenuConfigError(f"{context}: image_comparison needs at least one option with an image")
+
+        if "value_region_override" in option:
+            option["value_region_override"] = _frozen_region(option["value_region_override"], context)
+        return MappingProxyType(option)
+
+    def _index_by_number(self, tabs, num_tabs, context):
+        by_number = {}
+        for tab in tabs.values():
+            if not 1 <= tab.number <= num_tabs:
+                raise MenuConfigError(f"{context}: '{tab.name}' has tab_number {tab.number} outside 1..{num_tabs}")
+            if tab.number in by_number:
+                raise MenuConfigError(f"{context}: '{tab.name}' and '{by_number[tab.number].name}' share tab_number {tab.number}")
+            by_number[tab.number] = tab
+        return MappingProxyType(by_number)
+
+    def _collect_panel_regions(self):
+        regions = [self.tab_region, self.submenu_tab_region, SUBMENU_INDICATOR_REGION]
+        for tabs in (self.tabs, self.submenu_tabs):
+            for tab in tabs.values():
+                regions.extend(tab.sub_tab_positions)
+                for items in ((tab.items,) if tab.sub_tabs is None else tab.sub_tabs.values()):
+                    for item in items:
+                        regions.append(item.check_region)
+                        regions.append(item.value_region)
+        return tuple(regions)
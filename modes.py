@@ -0,0 +1,40 @@
+IDLE = "idle"
+VS_SCREEN = "vs_screen"
+MATCH = "match"
+TRAINING_MENU = "training_menu"
+
+TRANSITIONS = {
+    (IDLE, "vs_detected"): VS_SCREEN,
+    (IDLE, "menu_opened"): TRAINING_MENU,
+    (IDLE, "match_started"): MATCH,
+    (VS_SCREEN, "vs_lost"): IDLE,
+    (VS_SCREEN, "match_started"): MATCH,
+    (MATCH, "match_ended"): IDLE,
+    (TRAINING_MENU, "menu_closed"): IDLE,
+    (TRAINING_MENU, "match_started"): MATCH,
+}
+
+MODE_DETECTORS = {
+    IDLE: ("match_start", "vs_screen", "training_menu"),
+    VS_SCREEN: ("match_start", "vs_screen"),
+    MATCH: ("health", "gauges"),
+    TRAINING_MENU: ("match_start", "training_menu"),
+}
+
+class ModeMachine:
+    """Tracks which screen the game is on and which detectors may run there"""
+    __slots__ = ("mode", "transition_count")
+
+    def __init__(self, mode=IDLE):
+        self.mode = mode
+        self.transition_count = 0
+
+    def allows(self, detector):
+        return detector in MODE_DETECTORS[self.mode]
+
+    def handle(self, event):
+        new_mode = TRANSITIONS.get((self.mode, event))
+        if new_mode and new_mode != self.mode:
+            self.mode = new_mode
+            self.transition_count += 1
+        return self.mode
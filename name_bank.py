@@ -0,0 +1,76 @@
+import numpy as np
+from image_processing import TemplateBank, load_image_from_path
+from config import NAME_REGIONS, NAME_THRESHOLD, PLAYER_NAME_PATH, NAME_BANK_FOLDER, NAME_BANK_CACHE_PATH
+
+def name_template_paths():
+    paths = [PLAYER_NAME_PATH] if PLAYER_NAME_PATH.exists() else []
+    if NAME_BANK_FOLDER.exists():
+        paths += sorted(NAME_BANK_FOLDER.glob("*.png"))
+    return paths
+
+def next_name_template_path():
+    NAME_BANK_FOLDER.mkdir(exist_ok=True)
+    index = 1
+    while (NAME_BANK_FOLDER / f"account_{index}.png").exists():
+        index += 1
+    return NAME_BANK_FOLDER / f"account_{index}.png"
+
+def _manifest(paths):
+    manifest = []
+    for path in paths:
+        stat = path.stat()
+        manifest.append(f"{path}|{stat.st_size}|{stat.st_mtime_ns}")
+    return manifest
+
+def _load_cached_bank(manifest, region):
+    if not NAME_BANK_CACHE_PATH.exists():
+        return None
+    try:
+        with np.load(NAME_BANK_CACHE_PATH) as cached:
+            if (cached["manifest"].tolist() != manifest or int(cached["threshold"]) != NAME_THRESHOLD or
+                    tuple(cached["size"].tolist()) != (region["width"], region["height"])):
+                return None
+            return TemplateBank.from_packed(cached["names"].tolist(), region, NAME_THRESHOLD, cached["packed"])
+    except Exception as e:
+        print(f"Ignoring name bank cache: {e}")
+        return None
+
+def _save_cached_bank(manifest, bank):
+    try:
+        with open(NAME_BANK_CACHE_PATH, 'wb') as f:
+            np.savez(
+                f, manifest=np.array(manifest), names=np.array(bank.names), packed=bank.packed,
+                size=np.array(bank.size), threshold=np.array(NAME_THRESHOLD)
+            )
+    except Exception as e:
+        print(f"Could not save name bank cache: {e}")
+
+def load_name_bank():
+    """Every saved account name as one binarized bank; reuses the compiled cache while no file changed"""
+    paths = name_template_paths()
+    if not paths:
+        return None
+    region = NAME_REGIONS[0]
+    manifest = _manifest(paths)
+    bank = _load_cached_bank(manifest, region)
+    if bank is not None:
+        return bank
+
+    images = {}
+    for path in paths:
+        img = load_image_from_path(path)
+        if img is None:
+            print(f"Warning: Could not load {path}")
+            continue
+        images[path.stem] = img
+    if not images:
+        return None
+    bank = TemplateBank(images, region, NAME_THRESHOLD)
+    _save_cached_bank(manifest, bank)
+    return bank
+
+def match_player_name(name_bank, frame):
+    """Best account and its similarity on each side, both sides scored in one call"""
+    similarities = name_bank.batch_similarities([frame.region(region) for region in NAME_REGIONS])
+    best = similarities.argmax(axis=1)
+    return [(name_bank.names[best[side]], float(similarities[side, best[side]])) for side in range(len(NAME_REGIONS))]
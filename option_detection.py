@@ -1,94 +1,45 @@
 import numpy as np
-import cv2
-from capture import capture_region
+from capture import capture_from, capture_snapshot
 from audio import play_audio
+from detection_cache import DetectionCache
+from image_processing import load_image, TemplateBank, classify_colors, color_mask
+from config import MEDIA_FOLDER
 
-def get_value_region_for_item(item_name, tab_name, sub_tab_name, config, is_submenu=False):
-    """Calculate the screen region where this item's value appears"""
-    
-    tabs_dict = config["submenu_tabs"] if is_submenu else config["tabs"]
-    
-    if tab_name not in tabs_dict:
-        return None
-    
-    tab_data = tabs_dict[tab_name]
-    
-    if "item_options" in tab_data and item_name in tab_data["item_options"]:
-        option_config = tab_data["item_options"][item_name]
-        if "value_region_override" in option_config:
-            return option_config["value_region_override"]
-    
-    if not is_submenu and tab_data.get("has_sub_tabs", False) and sub_tab_name:
-        items = tab_data["sub_tabs"][sub_tab_name]
-    else:
-        items = tab_data.get("items", [])
-    
-    try:
-        item_index = items.index(item_name)
-    except (ValueError, AttributeError):
-        return None
-    
-    start_position = tab_data["start_position"]
-    position_idx = start_position + item_index - 1
-    
-    positions = config["item_detection"]["positions"]
-    if position_idx >= len(positions):
-        return None
-    
-    item_y = positions[position_idx]
-    
-    value_region_template = config["item_detection"]["value_region"]
-    
-    return {
-        "top": item_y + value_region_template["top_offset"],
-        "left": value_region_template["left"],
-        "width": value_region_template["width"],
-        "height": value_region_template["height"]
-    }
+_option_cache = DetectionCache("option")
+_reference_images = {}
+_reference_banks = {}
 
-def detect_option_value(item_name, tab_name, sub_tab_name, config, is_submenu=False):
+def detect_option_value(item, model, frame=None):
     """Detect the current value of a menu item option"""
-    tabs_dict = config["submenu_tabs"] if is_submenu else config["tabs"]
-    
-    if tab_name not in tabs_dict:
-        return None
-    
-    tab_config = tabs_dict[tab_name]
-    
-    if "item_options" not in tab_config:
-        return None
-    
-    if item_name not in tab_config["item_options"]:
+    option_config = item.option
+    if option_config is None:
         return None
     
-    option_config = tab_config["item_options"][item_name]
-    
-    region = get_value_region_for_item(item_name, tab_name, sub_tab_name, config, is_submenu)
-    
-    if not region:
-        return None
+    region = item.value_region
+    option_definitions = model.option_definitions
     
-    option_definitions = config["option_definitions"]
+    if frame is None or not frame.contains(region):
+        frame = capture_snapshot([region])
     
     if option_config["detection_method"] == "yellow_width":
-        tolerance = config["detection_settings"]["yellow_width_tolerance"]
-        return detect_by_yellow_width(region, option_config, option_definitions, tolerance)
+        tolerance = model.settings["yellow_width_tolerance"]
+        return _option_cache.lookup(item.key, frame.region(region), lambda: detect_by_yellow_width(
+            region, option_config, option_definitions, tolerance, frame
+        ))
     elif option_config["detection_method"] == "image_comparison":
         threshold = option_config.get("comparison_threshold", 0.85)
         binary_threshold = option_config.get("binary_threshold", None)
-        return detect_by_image_comparison(region, option_config, option_definitions, threshold, binary_threshold)
+        return _option_cache.lookup(item.key, frame.region(region), lambda: detect_by_image_comparison(
+            region, option_config, option_definitions, threshold, binary_threshold, frame
+        ))
     
     return None
 
-def detect_by_yellow_width(region, option_config, option_definitions, tolerance):
+def detect_by_yellow_width(region, option_config, option_definitions, tolerance, frame=None):
     """Detect option by measuring yellow text width"""
-    img = capture_region(region)
+    img = capture_from(frame, region)
     
-    yellow_mask = (
-        (img[:,:,0] >= 50) & (img[:,:,0] <= 120) & 
-        (img[:,:,1] >= 200) & (img[:,:,1] <= 255) &
-        (img[:,:,2] >= 200) & (img[:,:,2] <= 255)
-    )
+    yellow_mask = color_mask(classify_colors(img), "option_yellow")
     
     yellow_pixels = np.sum(yellow_mask, axis=0)
     columns_with_yellow = np.where(yellow_pixels > 0)[0]
@@ -124,59 +75,61 @@ def detect_by_yellow_width(region, option_config, option_definitions, tolerance)
         print(f"  [No match within tolerance, using default]")
         return option_definitions[default_key]
 
-def detect_by_image_comparison(region, option_config, option_definitions, threshold=0.85, binary_threshold=None):
-    """Detect option by comparing against reference images"""
-    from image_processing import load_image, compare_images_grayscale
-    from config import MEDIA_FOLDER
-    
-    img = capture_region(region)
-    
-    if binary_threshold is not None:
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        _, img = cv2.threshold(gray, binary_threshold, 255, cv2.THRESH_BINARY)
-        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-    
-    best_match = None
-    best_similarity = 0
-    best_option_key = None
-    
-    for option_key in option_config["options"]:
-        option = option_definitions[option_key]
-        
-        if "image" not in option:
-            continue
-        
-        ref_img_path = MEDIA_FOLDER / "menu" / option["image"]
-        
+def load_reference_image(image_name):
+    """Decode a menu reference image once; failures are remembered as None"""
+    if image_name not in _reference_images:
         try:
-            ref_img = load_image(ref_img_path)
-            
-            if binary_threshold is not None:
-                ref_gray = cv2.cvtColor(ref_img, cv2.COLOR_BGR2GRAY)
-                _, ref_img = cv2.threshold(ref_gray, binary_threshold, 255, cv2.THRESH_BINARY)
-                ref_img = cv2.cvtColor(ref_img, cv2.COLOR_GRAY2BGR)
-            
-            is_match, similarity = compare_images_grayscale(img, ref_img, threshold=threshold)
-            
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_match = option
-                best_option_key = option_key
+            _reference_images[image_name] = load_image(MEDIA_FOLDER / "menu" / image_name)
         except Exception as e:
-            print(f"  [Error loading reference image {option['image']}: {e}]")
-            continue
+            print(f"  [Error loading reference image {image_name}: {e}]")
+            _reference_images[image_name] = None
+    return _reference_images[image_name]
+
+def get_reference_bank(option_config, option_definitions, region, binary_threshold=None):
+    """Reference images of one option list, preprocessed for its value region"""
+    image_options = tuple(
+        (option_key, option_definitions[option_key]["image"])
+        for option_key in option_config["options"]
+        if "image" in option_definitions[option_key]
+    )
+    bank_key = (image_options, binary_threshold, (region["width"], region["height"]))
+    bank = _reference_banks.get(bank_key)
+    if bank is None:
+        reference_images = {}
+        for option_key, image_name in image_options:
+            reference_img = load_reference_image(image_name)
+            if reference_img is not None:
+                reference_images[option_key] = reference_img
+        bank = TemplateBank(reference_images, region, binary_threshold)
+        _reference_banks[bank_key] = bank
+    return bank
+
+def preload_option_references(model):
+    for item in model.option_items:
+        if item.option["detection_method"] == "image_comparison":
+            get_reference_bank(
+                item.option, model.option_definitions, item.value_region, item.option.get("binary_threshold", None)
+            )
+    print(f"Loaded {len(_reference_images)} menu option reference images")
+
+def detect_by_image_comparison(region, option_config, option_definitions, threshold=0.85, binary_threshold=None, frame=None):
+    """Detect option by comparing against reference images"""
+    img = capture_from(frame, region)
     
-    if best_match:
+    bank = get_reference_bank(option_config, option_definitions, region, binary_threshold)
+    best_option_key, best_similarity = bank.best_match(img)
+    
+    if best_option_key:
         print(f"  [Image matched to '{best_option_key}' (similarity: {best_similarity:.2f})]")
-        return best_match
+        return option_definitions[best_option_key]
     
     first_option_key = option_config["options"][0]
     print(f"  [No good match found, using first option '{first_option_key}']")
     return option_definitions[first_option_key]
 
-def announce_option_value(item_name, tab_name, sub_tab_name, config, is_submenu=False):
+def announce_option_value(item, model, frame=None):
     """Detect and announce the current option value for an item"""
-    detected_option = detect_option_value(item_name, tab_name, sub_tab_name, config, is_submenu)
+    detected_option = detect_option_value(item, model, frame)
     
     if detected_option:
         print(f"Option value: {detected_option['audio'].replace('.ogg', '')}")
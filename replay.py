@@ -0,0 +1,254 @@
+import struct
+import time
+import zlib
+from pathlib import Path
+import numpy as np
+
+FRAME_LOG_MAGIC = b"SF6FRAME"
+FRAME_LOG_VERSION = 2
+FRAME_LOG_HEADER = struct.Struct("<8sIiiIII")
+FRAME_LOG_HEADER_SIZE = 32
+FRAME_LOG_REGION = struct.Struct("<iiII")
+FRAME_RECORD_HEADER = struct.Struct("<dI")
+FRAME_COMPRESSION_LEVEL = 1
+
+class ReplayFinished(Exception):
+    pass
+
+def frame_record_dtype(width, height):
+    return np.dtype([("timestamp", "<f8"), ("pixels", np.uint8, (height, width, 3))])
+
+def read_frame_log_header(path):
+    """Bounds, format version and recorded regions of a frame log"""
+    with open(path, 'rb') as f:
+        header = f.read(FRAME_LOG_HEADER_SIZE)
+        if len(header) < FRAME_LOG_HEADER_SIZE:
+            raise ValueError(f"Frame log is truncated: {path}")
+        magic, version, left, top, width, height, region_count = FRAME_LOG_HEADER.unpack_from(header)
+        if magic != FRAME_LOG_MAGIC or version not in (1, FRAME_LOG_VERSION):
+            raise ValueError(f"Not a frame log: {path}")
+        bounds = {"top": top, "left": left, "width": width, "height": height}
+        regions = []
+        if version >= 2:
+            table = f.read(FRAME_LOG_REGION.size * region_count)
+            if len(table) < FRAME_LOG_REGION.size * region_count:
+                raise ValueError(f"Frame log is truncated: {path}")
+            for index in range(region_count):
+                region_top, region_left, region_width, region_height = FRAME_LOG_REGION.unpack_from(table, index * FRAME_LOG_REGION.size)
+                regions.append({"top": region_top, "left": region_left, "width": region_width, "height": region_height})
+    return bounds, version, regions
+
+def _recorded_regions(bounds, regions):
+    """Regions relative to the bounds, deduplicated, in a stable order"""
+    if not regions:
+        return [{"top": 0, "left": 0, "width": bounds["width"], "height": bounds["height"]}]
+    unique = []
+    for region in regions:
+        relative = {
+            "top": region["top"] - bounds["top"], "left": region["left"] - bounds["left"],
+            "width": region["width"], "height": region["height"]
+        }
+        if relative not in unique:
+            unique.append(relative)
+    return unique
+
+class FrameLog:
+    """Frames read back from a log written by FrameRecorder, decoded on demand"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.bounds, self.version, self.regions = read_frame_log_header(path)
+        shape = (self.bounds["height"], self.bounds["width"], 3)
+        if self.version == 1:
+            dtype = frame_record_dtype(self.bounds["width"], self.bounds["height"])
+            count = (self.path.stat().st_size - FRAME_LOG_HEADER_SIZE) // dtype.itemsize
+            if count <= 0:
+                raise ValueError(f"Frame log has no frames: {path}")
+            self._records = np.memmap(path, dtype=dtype, mode='r', offset=FRAME_LOG_HEADER_SIZE, shape=(count,))
+            self.timestamps = np.array(self._records["timestamp"])
+            return
+
+        self._data = np.memmap(path, dtype=np.uint8, mode='r')
+        offset = FRAME_LOG_HEADER_SIZE + FRAME_LOG_REGION.size * len(self.regions)
+        timestamps, payloads, sources = [], [], []
+        while offset + FRAME_RECORD_HEADER.size <= len(self._data):
+            timestamp, length = FRAME_RECORD_HEADER.unpack_from(self._data, offset)
+            offset += FRAME_RECORD_HEADER.size
+            if offset + length > len(self._data):
+                break
+            if length:
+                payloads.append((offset, length))
+            elif not payloads:
+                break
+            timestamps.append(timestamp)
+            sources.append(len(payloads) - 1)
+            offset += length
+        if not timestamps:
+            raise ValueError(f"Frame log has no frames: {path}")
+        self.timestamps = np.array(timestamps)
+        self._payloads = payloads
+        self._sources = sources
+        self._shape = shape
+        self._frame = None
+        self._decoded = None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def pixels(self, index):
+        if self.version == 1:
+            return self._records[index]["pixels"]
+        source = self._sources[index]
+        if source != self._decoded:
+            offset, length = self._payloads[source]
+            payload = np.frombuffer(zlib.decompress(self._data[offset:offset + length]), dtype=np.uint8)
+            # A fresh frame per decode: frames handed out earlier may still be buffered
+            self._frame = np.zeros(self._shape, dtype=np.uint8)
+            position = 0
+            for region in self.regions:
+                size = region["height"] * region["width"] * 3
+                self._frame[region["top"]:region["top"] + region["height"], region["left"]:region["left"] + region["width"]] = (
+                    payload[position:position + size].reshape(region["height"], region["width"], 3)
+                )
+                position += size
+            self._decoded = source
+        return self._frame
+
+def open_frame_log(path):
+    log = FrameLog(path)
+    return log.bounds, log
+
+class FrameRecorder:
+    """Appends timestamped frames to a frame log: only the regions, compressed, and unchanged frames as bare timestamps"""
+
+    def __init__(self, path, bounds, regions=None):
+        self.path = Path(path)
+        self.bounds = {key: bounds[key] for key in ("top", "left", "width", "height")}
+        self.regions = _recorded_regions(self.bounds, regions)
+        self.frame_count = 0
+        self.repeated_frames = 0
+        self.bytes_written = 0
+        self._previous = None
+        if self.path.exists() and self.path.stat().st_size > 0:
+            existing, version, existing_regions = read_frame_log_header(self.path)
+            if existing != self.bounds or version != FRAME_LOG_VERSION or existing_regions != self.regions:
+                raise ValueError(f"Frame log {self.path} was recorded for a different region or format")
+            self._file = open(self.path, 'ab')
+        else:
+            self._file = open(self.path, 'wb')
+            header = FRAME_LOG_HEADER.pack(
+                FRAME_LOG_MAGIC, FRAME_LOG_VERSION, self.bounds["left"], self.bounds["top"],
+                self.bounds["width"], self.bounds["height"], len(self.regions)
+            )
+            self._file.write(header.ljust(FRAME_LOG_HEADER_SIZE, b"\0"))
+            for region in self.regions:
+                self._file.write(FRAME_LOG_REGION.pack(region["top"], region["left"], region["width"], region["height"]))
+
+    def write(self, frame):
+        img = frame.region(self.bounds)
+        pixels = b"".join(
+            np.ascontiguousarray(img[region["top"]:region["top"] + region["height"], region["left"]:region["left"] + region["width"]]).tobytes()
+            for region in self.regions
+        )
+        if pixels == self._previous:
+            self._file.write(FRAME_RECORD_HEADER.pack(frame.timestamp, 0))
+            self.repeated_frames += 1
+            self.bytes_written += FRAME_RECORD_HEADER.size
+        else:
+            payload = zlib.compress(pixels, FRAME_COMPRESSION_LEVEL)
+            self._file.write(FRAME_RECORD_HEADER.pack(frame.timestamp, len(payload)))
+            self._file.write(payload)
+            self._previous = pixels
+            self.bytes_written += FRAME_RECORD_HEADER.size + len(payload)
+        self.frame_count += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+class ReplayBackend:
+    """Serves recorded frames in place of a live capture backend"""
+
+    def __init__(self, path, realtime=True):
+        self.path = Path(path)
+        self.realtime = realtime
+        self.method = None
+        self.bounds = None
+        self.capture_count = 0
+        self.tick_count = 0
+        self._records = None
+        self._timestamps = None
+        self._index = 0
+        self._started = None
+
+    def open(self):
+        if self.method:
+            return self
+        self.bounds, self._records = open_frame_log(self.path)
+        self._timestamps = self._records.timestamps
+        self._index = 0
+        self._started = time.time()
+        self.method = 'replay'
+        speed = "real-time" if self.realtime else "maximum speed"
+        print(f"Replaying {len(self._records)} frames from {self.path} at {speed}")
+        return self
+
+    def close(self):
+        self._records = None
+        self.method = None
+
+    def health(self):
+        elapsed = time.time() - self._started if self._started else 0
+        return {
+            "open": self.method is not None,
+            "method": self.method,
+            "captures": self.capture_count,
+            "failures": 0,
+            "frame_index": self._index,
+            "ticks": self.tick_count,
+            "elapsed": elapsed,
+            "ticks_per_second": self.tick_count / elapsed if elapsed > 0 else 0.0
+        }
+
+    def now(self):
+        if self._records is None:
+            return time.time()
+        self._sync()
+        return float(self._timestamps[self._index])
+
+    def next_tick(self):
+        if not self.method:
+            self.open()
+        if self.tick_count == 0:
+            self._started = time.time()
+        if self.realtime:
+            if self._recorded_now() > self._timestamps[-1]:
+                raise ReplayFinished()
+            self._sync()
+        elif self.tick_count > 0:
+            if self._index + 1 >= len(self._timestamps):
+                raise ReplayFinished()
+            self._index += 1
+        self.tick_count += 1
+
+    def grab(self, region):
+        if not self.method:
+            self.open()
+        self._sync()
+        top = region["top"] - self.bounds["top"]
+        left = region["left"] - self.bounds["left"]
+        if (top < 0 or left < 0 or top + region["height"] > self.bounds["height"] or
+                left + region["width"] > self.bounds["width"]):
+            raise ValueError(f"Region {region} was not recorded")
+        self.capture_count += 1
+        pixels = self._records.pixels(self._index)
+        return pixels[top:top + region["height"], left:left + region["width"]]
+
+    def _recorded_now(self):
+        return self._timestamps[0] + (time.time() - self._started)
+
+    def _sync(self):
+        if not self.realtime:
+            return
+        target = self._recorded_now()
+        self._index = max(0, int(np.searchsorted(self._timestamps, target, side='right')) - 1)
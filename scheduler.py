@@ -0,0 +1,84 @@
+import heapq
+import time
+
+class ScheduledTask:
+    def __init__(self, name, period, callback, when, deadline):
+        self.name = name
+        self.period = period
+        self.callback = callback
+        self.when = when
+        self.deadline = deadline
+        self.runs = 0
+        self.skipped = 0
+        self.missed = 0
+        self.total_jitter = 0.0
+        self.max_jitter = 0.0
+
+class Scheduler:
+    """Runs each registered detector when its own deadline comes due"""
+
+    def __init__(self, clock=time.time, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.tasks = {}
+        self._queue = []
+        self._sequence = 0
+
+    def register(self, name, period, callback, when=None):
+        task = ScheduledTask(name, period, callback, when, self.clock())
+        self.tasks[name] = task
+        self._push(task)
+        return task
+
+    def run_pending(self):
+        now = self.clock()
+        due = []
+        while self._queue and self._queue[0][0] <= now:
+            _, _, task = heapq.heappop(self._queue)
+            lateness = now - task.deadline
+            periods_late = int(lateness // task.period) if task.period > 0 else 0
+            task.missed += periods_late
+            task.deadline += task.period * (periods_late + 1)
+            due.append((task, lateness))
+
+        for task, lateness in due:
+            self._push(task)
+
+        # Each due detector runs at most once per tick, and its mode constraint is
+        # checked right before it runs so earlier detectors can switch modes
+        for task, lateness in due:
+            if task.when is not None and not task.when():
+                task.skipped += 1
+                continue
+
+            task.runs += 1
+            task.total_jitter += lateness
+            task.max_jitter = max(task.max_jitter, lateness)
+            task.callback(self.clock())
+
+    def time_until_next(self):
+        if not self._queue:
+            return None
+        return max(0.0, self._queue[0][0] - self.clock())
+
+    def sleep_until_next(self):
+        delay = self.time_until_next()
+        if delay:
+            self.sleep(delay)
+
+    def stats(self):
+        return {
+            name: {
+                "period": task.period,
+                "runs": task.runs,
+                "skipped": task.skipped,
+                "missed": task.missed,
+                "mean_jitter": task.total_jitter / task.runs if task.runs else 0.0,
+                "max_jitter": task.max_jitter
+            }
+            for name, task in self.tasks.items()
+        }
+
+    def _push(self, task):
+        self._sequence += 1
+        heapq.heappush(self._queue, (task.deadline, self._sequence, task))
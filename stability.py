@@ -0,0 +1,70 @@
+import time
+import cv2
+import numpy as np
+from capture import FrameSnapshot, bounding_region, capture_region
+from config import (
+    STABILITY_SAMPLE_INTERVAL, STABILITY_REQUIRED_SAMPLES, STABILITY_TOLERANCE, STABILITY_SIGNATURE_SIZE
+)
+
+def frame_signature(frame, regions, size=STABILITY_SIGNATURE_SIZE):
+    """Tiny grayscale thumbnail of every region, stacked into one vector"""
+    thumbnails = []
+    for region in regions:
+        gray = cv2.cvtColor(frame.region(region), cv2.COLOR_BGR2GRAY)
+        thumbnails.append(cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).ravel())
+    return np.concatenate(thumbnails).astype(np.int16)
+
+def signatures_agree(first, second, tolerance=STABILITY_TOLERANCE):
+    return np.abs(first - second).mean() <= tolerance
+
+class StabilityGate:
+    """Samples a set of ROIs until consecutive frames agree, instead of sleeping a fixed time"""
+
+    def __init__(self, regions, signature_regions=None, timeout=1.0, interval=STABILITY_SAMPLE_INTERVAL,
+                 required_samples=STABILITY_REQUIRED_SAMPLES, tolerance=STABILITY_TOLERANCE):
+        self.bounds = bounding_region(regions)
+        self.signature_regions = signature_regions or regions
+        self.timeout = timeout
+        self.interval = interval
+        self.required_samples = required_samples
+        self.tolerance = tolerance
+        self.waits = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+
+    def sample(self):
+        return FrameSnapshot(capture_region(self.bounds), self.bounds["left"], self.bounds["top"])
+
+    def wait(self):
+        """Newest frame once `required_samples` in a row agree, or the last one at the timeout; plus seconds waited"""
+        start = time.perf_counter()
+        previous = None
+        agreeing = 0
+        while True:
+            sample_start = time.perf_counter()
+            frame = self.sample()
+            signature = frame_signature(frame, self.signature_regions)
+            if previous is not None and signatures_agree(previous, signature, self.tolerance):
+                agreeing += 1
+            else:
+                agreeing = 1
+            previous = signature
+
+            waited = time.perf_counter() - start
+            if agreeing >= self.required_samples:
+                break
+            if waited + self.interval > self.timeout:
+                self.timeouts += 1
+                break
+            time.sleep(max(0, self.interval - (time.perf_counter() - sample_start)))
+
+        self.waits += 1
+        self.total_wait += waited
+        return frame, waited, agreeing >= self.required_samples
+
+    def stats(self):
+        return {
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "average_wait": self.total_wait / self.waits if self.waits else 0.0
+        }
@@ -0,0 +1,53 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# The modules live flat in the repo root and audio.py opens the mixer on import
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import audio
+
+CLIP_LENGTH = 0.03
+
+class FakeChannel:
+    def __init__(self, length):
+        self.ends = time.perf_counter() + length
+
+    def get_busy(self):
+        return time.perf_counter() < self.ends
+
+    def stop(self):
+        self.ends = 0
+
+class FakeMixer:
+    """Stands in for the audio cache; records the order and time clips start playing"""
+
+    def __init__(self, length=CLIP_LENGTH):
+        self.length = length
+        self.played = []
+        self.started = {}
+        self._lock = threading.Lock()
+
+    def get(self, audio_path, side=None):
+        mixer = self
+
+        class FakeSound:
+            def play(self):
+                with mixer._lock:
+                    mixer.played.append(audio_path.name)
+                    mixer.started.setdefault(audio_path.name, time.perf_counter())
+                return FakeChannel(mixer.length)
+
+        return FakeSound()
+
+@pytest.fixture
+def mixer(monkeypatch):
+    fake = FakeMixer()
+    monkeypatch.setattr(audio._audio_cache, "get", fake.get)
+    yield fake
+    audio.shutdown_audio()
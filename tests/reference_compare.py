@@ -0,0 +1,66 @@
+"""The per-template comparisons the matchers replaced, kept as the reference they must agree with"""
+import cv2
+import numpy as np
+from config import NAME_THRESHOLD, CHARACTER_THRESHOLD, IMAGE_THRESHOLD
+
+def compare_images(img1, img2):
+    if img1.shape != img2.shape:
+        img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
+    gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
+    gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
+    _, gray1 = cv2.threshold(gray1, IMAGE_THRESHOLD, 255, cv2.THRESH_BINARY)
+    _, gray2 = cv2.threshold(gray2, IMAGE_THRESHOLD, 255, cv2.THRESH_BINARY)
+    mse = np.mean((gray1.astype(float) - gray2.astype(float)) ** 2)
+    max_mse = 255 ** 2
+    similarity = 1 - (mse / max_mse)
+    return similarity
+
+def compare_images_no_threshold(img1, img2):
+    if img1.shape != img2.shape:
+        img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
+    gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
+    gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
+    mse = np.mean((gray1.astype(float) - gray2.astype(float)) ** 2)
+    max_mse = 255 ** 2
+    similarity = 1 - (mse / max_mse)
+    return similarity
+
+def compare_names(img1, img2):
+    if img1.shape != img2.shape:
+        img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
+    
+    gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
+    _, binary2 = cv2.threshold(gray2, NAME_THRESHOLD, 255, cv2.THRESH_BINARY)
+    
+    mse = np.mean((img1.astype(float) - binary2.astype(float)) ** 2)
+    max_mse = 255 ** 2
+    similarity = 1 - (mse / max_mse)
+    return similarity
+
+def compare_characters(img1, img2):
+    """Compare character images using binary threshold at 215"""
+    if img1.shape != img2.shape:
+        img2 = cv2.resize(img2, (img1.shape[1], img1.shape[0]))
+    
+    # Convert both to grayscale and apply same threshold
+    gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
+    gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
+    
+    _, binary1 = cv2.threshold(gray1, CHARACTER_THRESHOLD, 255, cv2.THRESH_BINARY)
+    _, binary2 = cv2.threshold(gray2, CHARACTER_THRESHOLD, 255, cv2.THRESH_BINARY)
+    
+    mse = np.mean((binary1.astype(float) - binary2.astype(float)) ** 2)
+    max_mse = 255 ** 2
+    similarity = 1 - (mse / max_mse)
+    return similarity
+
+def best_match(compare, captured_img, images):
+    """The find_best_*_match loop: first template with the highest similarity"""
+    best_match = None
+    best_similarity = 0
+    for name, img in images.items():
+        similarity = compare(captured_img, img)
+        if similarity > best_similarity:
+            best_similarity = similarity
+            best_match = name
+    return best_match, best_similarity
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""Stand-in for grim: writes the requested geometry of a synthetic screen as a binary PPM
+
+Pixel (x, y) of the screen is RGB (x % 256, y % 256, (x + y) % 256).
+"""
+import sys
+import numpy as np
+
+def screen_pixels(left, top, width, height):
+    xs = np.arange(left, left + width)
+    ys = np.arange(top, top + height)
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[:, :, 0] = xs[None, :] % 256
+    img[:, :, 1] = ys[:, None] % 256
+    img[:, :, 2] = (xs[None, :] + ys[:, None]) % 256
+    return img
+
+def main(args):
+    if "-t" not in args or args[args.index("-t") + 1] != "ppm" or "-g" not in args:
+        sys.stderr.write("stub grim only supports '-t ppm -g <geometry> -'\n")
+        return 2
+    position, size = args[args.index("-g") + 1].split(" ")
+    left, top = (int(value) for value in position.split(","))
+    width, height = (int(value) for value in size.split("x"))
+    out = sys.stdout.buffer
+    out.write(b"P6\n# stub grim\n%d %d\n255\n" % (width, height))
+    out.write(screen_pixels(left, top, width, height).tobytes())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+import audio
+
+def announce(audio_files, delays):
+    announcement = audio.Announcement()
+    for audio_file, delay in zip(audio_files, delays):
+        time.sleep(delay)
+        announcement.add(audio_file)
+    return announcement, announcement.close()
+
+CLIPS = ["Classic.ogg", "Gold.ogg", "GoldThree.ogg", "1200.ogg"]
+
+@pytest.mark.parametrize("delays", [
+    [0, 0, 0, 0],
+    [0, 0.1, 0.01, 0.1],
+    [0, 0.01, 0.2, 0],
+])
+def test_clips_play_in_the_order_added(mixer, delays):
+    announcement, handle = announce(CLIPS, delays)
+    assert handle.wait(5)
+    assert mixer.played == CLIPS
+    assert announcement.audio_files == CLIPS
+    assert announcement.first_clip_time <= announcement.last_clip_time
+
+def test_missing_clip_is_skipped_without_reordering(mixer):
+    audio_files = ["Classic.ogg", "NoSuchRank.ogg", "Gold.ogg"]
+    announcement, handle = announce(audio_files, [0, 0.05, 0])
+    assert handle.wait(5)
+    assert mixer.played == ["Classic.ogg", "Gold.ogg"]
+    assert announcement.audio_files == audio_files
+
+def test_announcement_without_clips_is_already_done(mixer):
+    announcement, handle = announce(["NoSuchRank.ogg"], [0])
+    assert handle.is_done()
+    assert announcement.first_clip_time is None
+    assert mixer.played == []
+
+def test_next_announcement_waits_for_the_open_one(mixer):
+    first = audio.Announcement()
+    first.add("Classic.ogg")
+    second = audio.Announcement()
+    second.add("Modern.ogg")
+    second_handle = second.close()
+    time.sleep(0.1)
+    first.add("Gold.ogg")
+    first_handle = first.close()
+    assert first_handle.wait(5) and second_handle.wait(5)
+    assert mixer.played == ["Classic.ogg", "Gold.ogg", "Modern.ogg"]
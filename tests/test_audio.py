@@ -0,0 +1,91 @@
+import time
+
+import audio
+from audio import Announcement, play_audio, play_health_alert
+
+LONG_CLIP = 0.3
+
+def wait_until_playing(mixer, count, timeout=2):
+    deadline = time.perf_counter() + timeout
+    while len(mixer.played) < count and time.perf_counter() < deadline:
+        time.sleep(0.005)
+    assert len(mixer.played) >= count
+
+def test_play_calls_return_before_the_clip_ends(mixer):
+    mixer.length = LONG_CLIP
+    start = time.perf_counter()
+    handle = play_audio("0.ogg", "menu")
+    assert time.perf_counter() - start < LONG_CLIP / 3
+    assert not handle.is_done()
+    assert handle.wait(2)
+    assert mixer.played == ["0.ogg"]
+
+def test_missing_clip_returns_a_finished_handle(mixer):
+    handle = play_audio("NoSuchClip.ogg", "menu")
+    assert handle.is_done()
+    assert mixer.played == []
+
+def test_health_alert_preempts_menu_audio(mixer):
+    mixer.length = LONG_CLIP
+    menu = play_audio("0.ogg", "menu")
+    wait_until_playing(mixer, 1)
+    alert = play_health_alert("left")
+    assert alert.wait(2) and menu.wait(2)
+    assert menu.preempted
+    assert mixer.played == ["0.ogg", "CA_health.ogg"]
+    assert mixer.started["CA_health.ogg"] - mixer.started["0.ogg"] < LONG_CLIP / 2
+
+def test_announcement_is_never_cut(mixer):
+    mixer.length = LONG_CLIP
+    announcement = Announcement()
+    announcement.add("Classic.ogg")
+    announcement.add("Gold.ogg")
+    handle = announcement.close()
+    wait_until_playing(mixer, 1)
+    alert = play_health_alert("right")
+    menu = play_audio("0.ogg", "menu", allow_interrupt=True)
+    assert handle.wait(3) and alert.wait(3) and menu.wait(3)
+    assert not handle.preempted
+    # The alert still jumps ahead of queued menu audio once the announcement is over
+    assert mixer.played == ["Classic.ogg", "Gold.ogg", "CA_health.ogg", "0.ogg"]
+    assert mixer.started["Gold.ogg"] - mixer.started["Classic.ogg"] >= LONG_CLIP * 0.9
+
+def test_newer_interruptible_clip_cancels_queued_one(mixer):
+    mixer.length = LONG_CLIP
+    announcement = Announcement()
+    announcement.add("Classic.ogg")
+    blocker = announcement.close()
+    wait_until_playing(mixer, 1)
+    first = play_audio("0.ogg", "menu", allow_interrupt=True)
+    second = play_audio("0-2.ogg", "menu", allow_interrupt=True)
+    assert first.wait(2)
+    assert first.cancelled
+    assert blocker.wait(2) and second.wait(2)
+    assert mixer.played == ["Classic.ogg", "0-2.ogg"]
+
+def test_newer_interruptible_clip_cuts_the_playing_one(mixer):
+    mixer.length = LONG_CLIP
+    first = play_audio("0.ogg", "menu", allow_interrupt=True)
+    wait_until_playing(mixer, 1)
+    second = play_audio("0-2.ogg", "menu", allow_interrupt=True)
+    assert first.wait(2) and second.wait(2)
+    assert first.preempted
+    assert mixer.started["0-2.ogg"] - mixer.started["0.ogg"] < LONG_CLIP / 2
+
+def test_menu_audio_without_interrupt_waits_its_turn(mixer):
+    mixer.length = 0.1
+    first = play_audio("0.ogg", "menu")
+    second = play_audio("0-2.ogg", "menu", allow_interrupt=True, preempt=False)
+    assert first.wait(2) and second.wait(2)
+    assert not first.preempted
+    assert mixer.played == ["0.ogg", "0-2.ogg"]
+
+def test_shutdown_without_waiting_cancels_the_queue(mixer):
+    mixer.length = LONG_CLIP
+    playing = play_audio("0.ogg", "menu")
+    wait_until_playing(mixer, 1)
+    queued = play_audio("0-2.ogg", "menu")
+    audio.shutdown_audio(wait=False)
+    assert playing.is_done() and queued.is_done()
+    assert queued.cancelled
+    assert mixer.played == ["0.ogg"]
@@ -0,0 +1,151 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import capture
+from capture import CaptureSession, FrameSnapshot, find_grim_candidates, parse_ppm
+
+STUB_GRIM = Path(__file__).with_name("stub_grim.py")
+
+def screen_bgr(region):
+    """What the stub grim's screen looks like through a BGR capture of `region`"""
+    xs = np.arange(region["left"], region["left"] + region["width"])
+    ys = np.arange(region["top"], region["top"] + region["height"])
+    img = np.empty((region["height"], region["width"], 3), dtype=np.uint8)
+    img[:, :, 2] = xs[None, :] % 256
+    img[:, :, 1] = ys[:, None] % 256
+    img[:, :, 0] = (xs[None, :] + ys[:, None]) % 256
+    return img
+
+@pytest.fixture
+def grim(tmp_path, monkeypatch):
+    script = tmp_path / "grim"
+    source = STUB_GRIM.read_text().split("\n", 1)[1]
+    script.write_text(f"#!{sys.executable}\n{source}")
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ.get('PATH', '')}")
+    return script
+
+@pytest.fixture
+def grim_session(grim, monkeypatch):
+    session = CaptureSession()
+    session.method = 'grim'
+    session.grim_path = str(grim)
+    monkeypatch.setattr(capture, "_session", session)
+    return session
+
+REGIONS = [
+    {"top": 834, "left": 56, "width": 35, "height": 31},
+    {"top": 912, "left": 334, "width": 82, "height": 26},
+    {"top": 928, "left": 1740, "width": 108, "height": 44},
+]
+
+def test_stub_grim_is_found_first_on_path(grim):
+    assert find_grim_candidates()[0] == str(grim)
+
+@pytest.mark.parametrize("region", REGIONS + [{"top": 0, "left": 0, "width": 1, "height": 1}])
+def test_grim_grab_returns_known_pixels(grim_session, region):
+    img = grim_session.grab(region)
+    assert img.shape == (region["height"], region["width"], 3)
+    assert img.dtype == np.uint8
+    assert np.array_equal(img, screen_bgr(region))
+    assert grim_session.health()["captures"] == 1
+
+def test_snapshot_grabs_the_union_in_one_subprocess(grim_session):
+    frame = capture.capture_snapshot(REGIONS)
+    assert grim_session.capture_count == 1
+    for region in REGIONS:
+        view = frame.region(region)
+        assert np.array_equal(view, screen_bgr(region))
+        assert np.shares_memory(view, frame.img)
+
+def test_failed_grim_is_counted(grim_session, grim):
+    grim.write_text(f"#!{sys.executable}\nimport sys\nsys.exit(1)\n")
+    with pytest.raises(Exception):
+        grim_session.grab(REGIONS[0])
+    assert grim_session.health()["failures"] == 1
+    assert grim_session.health()["last_error"]
+
+def test_parse_ppm_skips_comments_and_does_not_copy():
+    pixels = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+    data = b"P6 # maker\n# size follows\n3\t2\n255\n" + pixels.tobytes()
+    parsed = parse_ppm(data)
+    assert np.array_equal(parsed, pixels)
+    assert not parsed.flags.owndata
+
+@pytest.mark.parametrize("header", [b"P3\n1 1\n255\n", b"P6\n1 1\n65535\n"])
+def test_parse_ppm_rejects_other_formats(header):
+    with pytest.raises(ValueError):
+        parse_ppm(header + b"\0" * 6)
+
+def test_region_outside_the_snapshot_is_rejected():
+    frame = FrameSnapshot(np.zeros((10, 10, 3), dtype=np.uint8), 100, 200)
+    assert frame.contains({"top": 205, "left": 100, "width": 10, "height": 5})
+    with pytest.raises(ValueError):
+        frame.region({"top": 205, "left": 95, "width": 10, "height": 5})
+
+class CountingSession:
+    def __init__(self):
+        self.grabs = []
+
+    def grab(self, region):
+        self.grabs.append(dict(region))
+        return np.zeros((region["height"], region["width"], 3), dtype=np.uint8)
+
+    def now(self):
+        return time.time()
+
+@pytest.fixture
+def grabber(monkeypatch):
+    session = CountingSession()
+    monkeypatch.setattr(capture, "_session", session)
+    frame_grabber = capture.FrameGrabber([], interval=0.01)
+    monkeypatch.setattr(capture, "_grabber", frame_grabber.start())
+    yield frame_grabber, session
+    frame_grabber.stop()
+
+HEALTH_STRIP = [
+    {"top": 73, "left": 820, "width": 24, "height": 15},
+    {"top": 73, "left": 1076, "width": 24, "height": 15},
+]
+
+def test_grabber_without_regions_is_idle(grabber):
+    frame_grabber, session = grabber
+    time.sleep(0.05)
+    assert session.grabs == []
+    assert not frame_grabber.covers(REGIONS)
+    # Detectors grab their own regions meanwhile
+    frame = capture.capture_snapshot(REGIONS[:1])
+    assert session.grabs == [REGIONS[0]]
+    assert frame.img.shape[:2] == (REGIONS[0]["height"], REGIONS[0]["width"])
+
+def test_grabber_grabs_only_the_mode_regions(grabber):
+    frame_grabber, session = grabber
+    frame_grabber.retarget(HEALTH_STRIP)
+    frame = capture.capture_snapshot(HEALTH_STRIP[:1])
+    assert frame.img.shape[:2] == (15, 280)
+    assert all(grab == capture.bounding_region(HEALTH_STRIP) for grab in session.grabs)
+
+    frame_grabber.retarget(REGIONS[:1])
+    assert capture.capture_snapshot(REGIONS[:1]).img.shape[:2] == (31, 35)
+    assert not frame_grabber.covers(HEALTH_STRIP)
+
+    frame_grabber.retarget(None)
+    time.sleep(0.03)
+    grabs = len(session.grabs)
+    time.sleep(0.05)
+    assert len(session.grabs) == grabs
+
+def test_recording_grabber_keeps_its_regions(tmp_path, monkeypatch):
+    monkeypatch.setattr(capture, "_session", CountingSession())
+    frame_grabber = capture.FrameGrabber(HEALTH_STRIP, record_path=tmp_path / "log.bin")
+    try:
+        frame_grabber.retarget(HEALTH_STRIP)
+        with pytest.raises(RuntimeError):
+            frame_grabber.retarget(REGIONS)
+    finally:
+        frame_grabber.stop()
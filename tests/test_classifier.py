@@ -0,0 +1,55 @@
+import pytest
+
+import classifier
+from classifier import FrequencyClassifier
+from config import (
+    CHARACTER_REGIONS, CHARACTER_THRESHOLD, IMAGE_THRESHOLD, MIN_CHARACTER_THRESHOLD, MIN_RANK_THRESHOLD, RANK_REGIONS,
+    RANKS
+)
+from image_processing import TemplateBank
+from test_template_bank import live_captures, load_characters, load_family
+
+@pytest.fixture(autouse=True)
+def frequencies(monkeypatch):
+    monkeypatch.setattr(classifier, "_frequencies", {})
+    monkeypatch.setattr(classifier, "_classifiers", [])
+    return classifier._frequencies
+
+def test_small_family_skips_the_bound_pass(monkeypatch):
+    images = load_family(RANKS)
+    bank = TemplateBank(images, RANK_REGIONS[0], IMAGE_THRESHOLD)
+    templates = FrequencyClassifier("rank", bank, MIN_RANK_THRESHOLD)
+    monkeypatch.setattr(bank, "lower_bounds", lambda img: pytest.fail("bound pass on a small family"))
+    for img in live_captures(images, RANK_REGIONS[0]):
+        assert templates.best_match(img) == bank.best_match(img)
+    assert templates.stats()["early_exits"] == 0
+
+def test_bound_pass_matches_exhaustive_search(monkeypatch):
+    monkeypatch.setattr(classifier, "CLASSIFIER_MIN_BOUND_TEMPLATES", 0)
+    images = load_characters("left")
+    bank = TemplateBank(images, CHARACTER_REGIONS[0], CHARACTER_THRESHOLD)
+    templates = FrequencyClassifier("character", bank, MIN_CHARACTER_THRESHOLD)
+    templates.record(bank.names[3])
+    for img in live_captures(images, CHARACTER_REGIONS[0]):
+        name, similarity = bank.best_match(img)
+        assert templates.best_match(img) == (name, pytest.approx(similarity, abs=1e-12))
+    assert templates.stats()["early_exits"] > 0
+
+def test_only_recorded_matches_are_counted(monkeypatch, frequencies):
+    monkeypatch.setattr(classifier, "CLASSIFIER_MIN_BOUND_TEMPLATES", 0)
+    images = load_characters("left")
+    bank = TemplateBank(images, CHARACTER_REGIONS[0], CHARACTER_THRESHOLD)
+    templates = FrequencyClassifier("character", bank, MIN_CHARACTER_THRESHOLD)
+    captures = live_captures(images, CHARACTER_REGIONS[0])
+    for img in captures:
+        templates.best_match(img)
+    # Matches the caller discarded leave nothing to save
+    assert frequencies == {}
+
+    name = bank.names[5]
+    templates.record(name)
+    templates.record(name)
+    assert frequencies == {"character": {name: 2}}
+    exits = templates.early_exits
+    assert templates.best_match(captures[5])[0] == name
+    assert templates.early_exits == exits + 1
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+import gauges
+from capture import FrameSnapshot
+from config import HEALTH_BAR_REGIONS
+from gauges import GaugeSampler, GaugeTimeline, health_gauges
+
+RED = (95, 28, 217)
+BLUE = (186, 107, 13)
+
+def screen(left_fill, right_fill):
+    """A 1080p frame with each health bar filled from its outer end"""
+    img = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    for region, fill, color in zip(HEALTH_BAR_REGIONS, (left_fill, right_fill), (RED, BLUE)):
+        width = int(region["width"] * fill)
+        top, left = region["top"], region["left"]
+        if region["side"] == "left":
+            img[top:top + region["height"], left + region["width"] - width:left + region["width"]] = color
+        else:
+            img[top:top + region["height"], left:left + width] = color
+    return img
+
+@pytest.fixture
+def sampler():
+    return GaugeSampler(health_gauges())
+
+def test_read_classifies_only_the_gauge_strip(sampler, monkeypatch):
+    shapes = []
+    classify = gauges.classify_colors
+    monkeypatch.setattr(gauges, "classify_colors", lambda img: shapes.append(img.shape) or classify(img))
+    levels = sampler.read(FrameSnapshot(screen(0.5, 1.0), 0, 0, 1.0))
+    assert shapes == [(sampler.bounds["height"], sampler.bounds["width"], 3)]
+    assert levels["health_left"] == pytest.approx(50, abs=0.2)
+    assert levels["health_right"] == 100
+
+def test_frame_already_sampled_adds_no_row(sampler):
+    frame = FrameSnapshot(screen(1.0, 1.0), 0, 0, 1.0)
+    assert sampler.read(frame) is not None
+    assert sampler.read(frame) is None
+    assert sampler.read(FrameSnapshot(screen(0.25, 1.0), 0, 0, 1.1))["health_left"] == pytest.approx(25, abs=0.2)
+    timestamps, values = sampler.timeline.window(1.0)
+    assert timestamps.tolist() == [1.0, 1.1]
+    assert sampler.stats()["samples"] == 2
+
+def test_timeline_keeps_the_newest_rows():
+    timeline = GaugeTimeline(["a"], capacity=4)
+    for index in range(6):
+        timeline.append(index, [index * 10])
+    timestamps, values = timeline.window(10)
+    assert timestamps.tolist() == [2, 3, 4, 5]
+    assert timeline.latest() == {"a": 50}
@@ -0,0 +1,180 @@
+import numpy as np
+import pytest
+
+import capture
+import health
+from config import (
+    HEALTH_CHECK_INTERVAL, HEALTH_CONFIRMATION_CHECKS, HEALTH_CONFIRMATION_DELAY, HEALTH_REGIONS,
+    MATCH_END_CONFIRMATION_DELAY
+)
+from scheduler import Scheduler
+
+TICK = 0.01
+
+class HealthReplay:
+    """Feeds recorded bar colors through the health and health_confirm tasks on a fake clock"""
+
+    def __init__(self, monkeypatch):
+        self.clock = 0.0
+        self.ticks = 0
+        self.frame_time = None
+        self.colors = {"left": 'red', "right": 'blue'}
+        self.alerts = []
+        self.state = health.HealthState()
+
+        # Stands in for the capture session, so direct grabs are stamped with the fake clock
+        monkeypatch.setattr(capture, "_session", self)
+        monkeypatch.setattr(capture, "_grabber", None)
+        monkeypatch.setattr(health, "classify_health",
+                            lambda regions, imgs: [self.colors[region["side"]] for region in regions])
+        monkeypatch.setattr(health, "play_health_alert", lambda side: self.alerts.append((side, self.clock)))
+
+        self.scheduler = Scheduler(clock=lambda: self.clock, sleep=None)
+        self.scheduler.register("health", HEALTH_CHECK_INTERVAL, self.check)
+        self.scheduler.register("health_confirm", HEALTH_CONFIRMATION_DELAY, self.check,
+                                when=self.state.confirming)
+
+    def grab(self, region):
+        return np.zeros((region["height"], region["width"], 3), dtype=np.uint8)
+
+    def now(self):
+        """Timestamp of a grabbed frame; frozen while a test re-reads one frame"""
+        return self.clock if self.frame_time is None else self.frame_time
+
+    def check(self, current_time):
+        health.check_health_bars(self.state, current_time)
+
+    def advance(self, seconds):
+        for _ in range(int(round(seconds / TICK))):
+            self.clock = self.ticks * TICK
+            self.ticks += 1
+            self.scheduler.run_pending()
+
+    def play(self, side, sequence):
+        """Each color shows for one confirmation delay on `side`; the other side keeps its color"""
+        for color in sequence:
+            self.colors[side] = color
+            self.advance(HEALTH_CONFIRMATION_DELAY)
+
+    def hold(self, side, color, seconds):
+        self.colors[side] = color
+        self.advance(seconds)
+
+    def until_confirming(self, side):
+        """Show yellow until a reading opens the side's confirmation window"""
+        self.colors[side] = 'yellow'
+        while self.state.confirmations[side] is None:
+            self.advance(TICK)
+
+@pytest.fixture
+def replay(monkeypatch):
+    return HealthReplay(monkeypatch)
+
+CONFIRMATION_SPAN = HEALTH_CONFIRMATION_DELAY * (HEALTH_CONFIRMATION_CHECKS - 1)
+
+def test_full_health_never_alerts(replay):
+    replay.hold("left", 'red', 2.0)
+    replay.hold("right", 'blue', 2.0)
+    assert replay.alerts == []
+    assert replay.state.confirmations == {"left": None, "right": None}
+    assert replay.scheduler.tasks["health_confirm"].runs == 0
+
+@pytest.mark.parametrize("sequence", [
+    ['red'],
+    ['yellow', 'red', 'red'],
+    ['red', 'yellow', 'red', 'yellow', 'red', 'red', 'red'],
+])
+def test_flicker_is_filtered(replay, sequence):
+    replay.until_confirming("left")
+    replay.play("left", sequence)
+    replay.hold("left", 'red', 0.5)
+    assert replay.alerts == []
+    assert replay.state.confirmations["left"] is None
+
+def test_sustained_yellow_alerts_once_after_confirmation(replay):
+    replay.hold("left", 'red', 0.3)
+    replay.until_confirming("left")
+    start = replay.clock
+    replay.hold("left", 'yellow', 1.0)
+    assert len(replay.alerts) == 1
+    side, alert_time = replay.alerts[0]
+    assert side == "left"
+    assert alert_time - start == pytest.approx(CONFIRMATION_SPAN, abs=health.CONFIRMATION_TIME_TOLERANCE + TICK)
+    assert replay.state.alert_played["left"]
+
+def test_late_failure_resets_confirmation(replay):
+    replay.until_confirming("right")
+    replay.hold("right", 'yellow', CONFIRMATION_SPAN - HEALTH_CONFIRMATION_DELAY / 2)
+    assert replay.state.confirmations["right"].samples == HEALTH_CONFIRMATION_CHECKS - 1
+    # The last check before the alert reads the base color again
+    replay.hold("right", 'blue', 0.2)
+    assert replay.alerts == []
+    assert replay.state.confirmations["right"] is None
+
+    replay.hold("right", 'yellow', 1.0)
+    assert [side for side, _ in replay.alerts] == ["right"]
+
+def test_frame_read_twice_counts_once(replay):
+    replay.until_confirming("left")
+    # The grabber has not delivered a newer frame, so the confirmation checks keep
+    # seeing the one that opened the window
+    replay.frame_time = replay.clock
+    replay.hold("left", 'yellow', CONFIRMATION_SPAN + HEALTH_CONFIRMATION_DELAY)
+    assert replay.alerts == []
+    assert replay.state.confirmations["left"].samples == 1
+
+    replay.frame_time = None
+    replay.hold("left", 'yellow', 1.0)
+    assert [side for side, _ in replay.alerts] == ["left"]
+
+def test_alert_rearms_on_base_color(replay):
+    replay.hold("left", 'yellow', 1.0)
+    replay.hold("left", 'red', 0.6)
+    assert not replay.state.alert_played["left"]
+    replay.hold("left", 'yellow', 1.0)
+    assert [side for side, _ in replay.alerts] == ["left", "left"]
+
+def test_sides_confirm_independently(replay):
+    replay.colors["right"] = 'yellow'
+    replay.play("left", ['yellow'] + ['red'] * 5)
+    replay.play("left", ['yellow'] + ['red'] * 5)
+    assert [side for side, _ in replay.alerts] == ["right"]
+
+def test_match_end_is_timed_on_the_scheduler_clock(replay):
+    replay.advance(1.0)
+    replay.frame_time = 0.0
+    replay.colors = {"left": None, "right": None}
+    replay.advance(HEALTH_CHECK_INTERVAL)
+    assert replay.state.match_end_check_pending
+    end_check_time = replay.state.match_end_check_time
+    assert end_check_time >= 1.0
+    assert not health.check_health_bars(replay.state, replay.clock)
+    assert health.check_health_bars(replay.state, end_check_time + MATCH_END_CONFIRMATION_DELAY)
+
+BAR_COLORS = {'red': (95, 28, 217), 'yellow': (107, 248, 251), 'blue': (186, 107, 13), None: (0, 0, 0)}
+
+def bar(color, region, stray=0):
+    img = np.empty((region["height"], region["width"], 3), dtype=np.uint8)
+    img[:] = BAR_COLORS[color]
+    # Pixels off the color in the 7x7 center patch
+    patch = health.health_patch(img)
+    for index in range(stray):
+        patch[index // 7, index % 7] = (0, 0, 0)
+    return img
+
+@pytest.mark.parametrize("left, right", [('red', 'blue'), ('yellow', 'blue'), ('red', 'yellow'), (None, 'red')])
+def test_both_bars_are_classified_in_one_call(monkeypatch, left, right):
+    calls = []
+    classify = health.check_health_colors
+    monkeypatch.setattr(health, "check_health_colors", lambda patches: calls.append(len(patches)) or classify(patches))
+    health._health_cache.clear()
+    imgs = [bar(left, HEALTH_REGIONS[0]), bar(right, HEALTH_REGIONS[1])]
+    assert health.classify_health(HEALTH_REGIONS, imgs) == [left, right]
+    assert health.classify_health(HEALTH_REGIONS, imgs) == [left, right]
+    assert calls == [2]
+
+@pytest.mark.parametrize("stray, color", [(0, 'yellow'), (9, 'yellow'), (10, None)])
+def test_patch_needs_eighty_percent_of_a_color(stray, color):
+    imgs = [bar('yellow', region, stray if region["side"] == "left" else 0) for region in HEALTH_REGIONS]
+    health._health_cache.clear()
+    assert health.classify_health(HEALTH_REGIONS, imgs) == [color, 'yellow']
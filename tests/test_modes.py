@@ -0,0 +1,231 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import audio
+import capture
+import classifier
+import config
+import health
+import stability
+import training_menu
+import visualAudioAssist
+from config import (
+    CHECK_INTERVAL, CONTROL_REGIONS, HEALTH_CHECK_INTERVAL, HEALTH_CONFIRMATION_DELAY, MATCH_CHECK_INTERVAL,
+    MATCH_END_CONFIRMATION_DELAY, MENU_CONFIRMATION_CHECKS, NAME_REGIONS, NAME_THRESHOLD, STABILITY_REQUIRED_SAMPLES
+)
+from image_processing import TemplateBank
+from modes import IDLE, MATCH, TRAINING_MENU, VS_SCREEN, ModeMachine
+from scheduler import Scheduler
+from vs_screen import handle_vs_screen_detection
+
+TICK = 0.01
+START_TIME = 1000.0
+
+@pytest.fixture(scope="module")
+def assets():
+    control_templates, rank_templates, division_templates, mr_templates = visualAudioAssist.load_game_images()
+    character_templates = visualAudioAssist.load_character_images()
+    enabled, menu_ref_img, submenu_ref_img = visualAudioAssist.setup_training_menu()
+    assert enabled
+    name_img = np.random.default_rng(0).integers(0, 256, (NAME_REGIONS[0]["height"], NAME_REGIONS[0]["width"], 3),
+                                                 dtype=np.uint8)
+    return SimpleNamespace(
+        control=control_templates, rank=rank_templates, division=division_templates, mr=mr_templates,
+        character=character_templates, names=TemplateBank({"player": name_img}, NAME_REGIONS[0], NAME_THRESHOLD),
+        name_img=name_img, control_img=visualAudioAssist.load_image(config.MEDIA_FOLDER / "Classic.png"),
+        menu=config.training_menu_model, menu_ref=menu_ref_img, submenu_ref=submenu_ref_img
+    )
+
+class Game:
+    """visualAudioAssist.main's detectors and wiring on a fake clock, reading a painted screen through a stub capture"""
+
+    def __init__(self, monkeypatch, assets):
+        self.assets = assets
+        self.now = START_TIME
+        self.ticks = 0
+        self.captures = []
+        self.health_color = None
+        self.screen = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+        monkeypatch.setattr(capture, "capture_region", lambda region: self.grab("snapshot", region))
+        monkeypatch.setattr(stability, "capture_region", lambda region: self.grab("stability", region))
+        monkeypatch.setattr(capture._session, "now", lambda: self.now)
+        monkeypatch.setattr(capture, "_grabber", None)
+        monkeypatch.setattr(classifier, "_frequencies", {})
+        monkeypatch.setattr(health, "classify_health", lambda regions, imgs: [self.health_color] * len(regions))
+        monkeypatch.setattr(training_menu, "time", SimpleNamespace(sleep=self.sleep))
+
+        self.modes = ModeMachine()
+        self.health_state = health.HealthState()
+        self.menu_state = training_menu.MenuState()
+        self.last_audio_time = 0
+        self.scheduler = Scheduler(clock=lambda: self.now, sleep=None)
+        modes = self.modes
+
+        def run_match_start(current_time):
+            event = health.handle_match_start(current_time, self.health_state)
+            if event:
+                modes.handle(event)
+
+        def run_health_check(current_time):
+            event = health.handle_health_check(current_time, self.health_state)
+            if event:
+                modes.handle(event)
+
+        def run_vs_screen(current_time):
+            vs_detected, new_mode, self.last_audio_time = handle_vs_screen_detection(
+                current_time, self.last_audio_time, assets.control, assets.names,
+                assets.rank, assets.division, assets.mr, assets.character
+            )
+            modes.handle("vs_detected" if vs_detected else "vs_lost")
+
+        def run_training_menu(current_time):
+            menu_open = training_menu.handle_training_menu(
+                self.menu_state, assets.menu, assets.menu_ref, assets.submenu_ref
+            )
+            modes.handle("menu_opened" if menu_open else "menu_closed")
+
+        self.scheduler.register("match_start", MATCH_CHECK_INTERVAL, run_match_start,
+                                when=lambda: modes.allows("match_start"))
+        self.scheduler.register("health", HEALTH_CHECK_INTERVAL, run_health_check,
+                                when=lambda: modes.allows("health"))
+        self.scheduler.register("health_confirm", HEALTH_CONFIRMATION_DELAY, run_health_check,
+                                when=lambda: modes.allows("health") and self.health_state.confirming())
+        self.scheduler.register("vs_screen", CHECK_INTERVAL, run_vs_screen,
+                                when=lambda: modes.allows("vs_screen"))
+        self.scheduler.register("training_menu", assets.menu.settings["menu_check_interval"], run_training_menu,
+                                when=lambda: modes.allows("training_menu"))
+
+    def grab(self, source, region):
+        self.captures.append(source)
+        top, left = region["top"], region["left"]
+        return self.screen[top:top + region["height"], left:left + region["width"]].copy()
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def paint(self, region, img):
+        self.screen[region["top"]:region["top"] + region["height"], region["left"]:region["left"] + region["width"]] = img
+
+    def show_vs_screen(self):
+        for region in CONTROL_REGIONS:
+            self.paint(region, self.assets.control_img)
+        self.paint(NAME_REGIONS[0], self.assets.name_img)
+
+    def open_menu(self):
+        self.paint(self.assets.menu.tab_region, self.assets.menu_ref)
+
+    def clear(self):
+        self.screen[:] = 0
+
+    def tick(self):
+        """Captures made by one scheduler tick, by source"""
+        self.now = START_TIME + self.ticks * TICK
+        self.ticks += 1
+        before = len(self.captures)
+        self.scheduler.run_pending()
+        made = self.captures[before:]
+        return {source: made.count(source) for source in set(made)}
+
+    def run_for(self, seconds):
+        return [sum(self.tick().values()) for _ in range(int(round(seconds / TICK)))]
+
+    def runs(self, *names):
+        return sum(self.scheduler.tasks[name].runs for name in names)
+
+@pytest.fixture
+def game(monkeypatch, assets, mixer):
+    return Game(monkeypatch, assets)
+
+IDLE_DETECTORS = ("match_start", "vs_screen", "training_menu")
+
+def test_idle_runs_each_detector_once_per_period(game):
+    # Health bar probe, both control icons in one strip, and the menu tab bar
+    assert game.tick() == {"snapshot": 3}
+    assert game.modes.mode == IDLE
+
+    captures = game.run_for(MATCH_CHECK_INTERVAL)
+    assert max(captures) == 3
+    assert sum(captures) == game.runs(*IDLE_DETECTORS) - 3
+    assert game.runs("health") == 0
+
+def test_match_start_costs_one_capture_then_one_per_health_tick(game):
+    game.health_color = 'red'
+    # match_start sees the bar, and health is the only other detector allowed in the same tick
+    assert game.tick() == {"snapshot": 2}
+    assert game.modes.mode == MATCH
+    assert game.modes.transition_count == 1
+
+    health_runs = game.runs("health")
+    captures = game.run_for(1.0)
+    assert max(captures) == 1
+    assert sum(captures) == game.runs("health") - health_runs
+    assert game.runs("health") - health_runs == pytest.approx(1.0 / HEALTH_CHECK_INTERVAL, abs=1)
+    assert game.runs(*IDLE_DETECTORS) == 1
+
+def test_match_end_returns_to_idle_detectors(game):
+    game.health_color = 'red'
+    game.tick()
+    game.run_for(0.5)
+    assert game.modes.mode == MATCH
+
+    game.health_color = None
+    captures = []
+    while game.modes.mode == MATCH and len(captures) * TICK < MATCH_END_CONFIRMATION_DELAY + 2 * HEALTH_CHECK_INTERVAL:
+        captures.append(sum(game.tick().values()))
+    assert game.modes.mode == IDLE
+    assert game.modes.transition_count == 2
+    assert max(captures) == 1
+
+    health_runs = game.runs("health")
+    idle_runs = game.runs(*IDLE_DETECTORS)
+    captures = game.run_for(CHECK_INTERVAL)
+    assert game.runs("health") == health_runs
+    assert sum(captures) == game.runs(*IDLE_DETECTORS) - idle_runs
+    assert game.scheduler.tasks["health"].skipped > 0
+
+def test_vs_screen_announces_from_one_settled_frame(game, mixer):
+    game.show_vs_screen()
+    # match_start, the control strip, then the stability gate's samples; the menu check
+    # is due in the same tick but is already gated off by the new mode
+    assert game.tick() == {"snapshot": 2, "stability": STABILITY_REQUIRED_SAMPLES}
+    assert game.modes.mode == VS_SCREEN
+    assert game.last_audio_time == START_TIME
+    assert game.runs("training_menu") == 0
+    # The blank rank region reads as Bronze, whose division is announced; the speculative MR match
+    # is discarded and goes uncounted
+    assert classifier._frequencies == {"rank": {"Bronze": 1}, "division": {"One": 1}}
+
+    # Cooldown: each further VS check is the control strip alone
+    vs_runs = game.runs("vs_screen")
+    runs = game.runs("match_start", "vs_screen")
+    captures = game.run_for(MATCH_CHECK_INTERVAL)
+    assert game.runs("training_menu") == 0
+    assert sum(captures) == game.runs("match_start", "vs_screen") - runs
+    assert game.runs("vs_screen") - vs_runs == MATCH_CHECK_INTERVAL / CHECK_INTERVAL
+
+    game.clear()
+    game.run_for(CHECK_INTERVAL)
+    assert game.modes.mode == IDLE
+    audio.shutdown_audio()
+    assert mixer.played[0] == "Classic.ogg"
+
+def test_menu_open_confirms_then_reads_one_panel_per_check(game):
+    game.open_menu()
+    # match_start, the control strip, then the menu tab bar once per confirmation
+    assert game.tick() == {"snapshot": 2 + MENU_CONFIRMATION_CHECKS}
+    assert game.modes.mode == TRAINING_MENU
+
+    runs = game.runs("match_start", "training_menu")
+    captures = game.run_for(MATCH_CHECK_INTERVAL)
+    assert game.runs("vs_screen") == 1
+    # Every later menu check reads the whole panel from a single snapshot
+    assert sum(captures) == game.runs("match_start", "training_menu") - runs
+    assert max(captures) <= 2
+
+    game.health_color = 'red'
+    game.run_for(MATCH_CHECK_INTERVAL)
+    assert game.modes.mode == MATCH
+    assert game.modes.transition_count == 2
@@ -0,0 +1,112 @@
+import time
+
+import numpy as np
+import pytest
+
+import stability
+from stability import StabilityGate, frame_signature, signatures_agree
+from capture import FrameSnapshot
+
+REGIONS = [
+    {"top": 20, "left": 10, "width": 60, "height": 30},
+    {"top": 120, "left": 90, "width": 80, "height": 40},
+]
+TIMEOUT = 0.6
+
+class BlinkingScreen:
+    """A VS screen behind a white flash that fades out over `blink` seconds, with sensor noise"""
+
+    def __init__(self, blink, flash=150, noise=2, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.screen = self.rng.integers(0, 100, (200, 200, 3), dtype=np.uint8)
+        self.blink = blink
+        self.flash = flash
+        self.noise = noise
+        self.start = time.perf_counter()
+
+    def grab(self, region):
+        elapsed = time.perf_counter() - self.start
+        img = self.screen.astype(np.int16)
+        if elapsed < self.blink:
+            img = img + int(self.flash * (1 - elapsed / self.blink))
+        if self.noise:
+            img = img + self.rng.integers(-self.noise, self.noise + 1, img.shape)
+        img = np.clip(img, 0, 255).astype(np.uint8)
+        return img[region["top"]:region["top"] + region["height"], region["left"]:region["left"] + region["width"]]
+
+    def is_clean(self, frame, tolerance=2):
+        for region in REGIONS:
+            expected = self.screen[region["top"]:region["top"] + region["height"],
+                                   region["left"]:region["left"] + region["width"]]
+            if np.abs(frame.region(region).astype(np.int16) - expected).max() > tolerance:
+                return False
+        return True
+
+@pytest.fixture
+def screen(monkeypatch):
+    def show(blink, **kwargs):
+        blinking = BlinkingScreen(blink, **kwargs)
+        monkeypatch.setattr(stability, "capture_region", blinking.grab)
+        return blinking
+    return show
+
+@pytest.mark.parametrize("blink", [0, 0.06, 0.15, 0.3])
+def test_short_blink_settles_on_a_clean_frame(screen, blink):
+    blinking = screen(blink)
+    gate = StabilityGate(REGIONS, timeout=TIMEOUT)
+    frame, waited, stable = gate.wait()
+    assert stable
+    assert blinking.is_clean(frame)
+    assert waited >= gate.interval * (gate.required_samples - 1) * 0.9
+    assert waited < TIMEOUT
+    assert gate.stats()["timeouts"] == 0
+
+@pytest.mark.parametrize("blink", [0.8, 1.0])
+def test_long_blink_times_out(screen, blink):
+    # Still fading at the timeout, and faster than the tolerance from one sample to the next
+    blinking = screen(blink)
+    gate = StabilityGate(REGIONS, timeout=TIMEOUT)
+    frame, waited, stable = gate.wait()
+    assert not stable
+    assert not blinking.is_clean(frame)
+    assert TIMEOUT - gate.interval * 2 <= waited <= TIMEOUT + 0.05
+    assert gate.stats() == {"waits": 1, "timeouts": 1, "average_wait": waited}
+
+def test_noise_within_tolerance_counts_as_stable(screen):
+    screen(0, noise=6)
+    gate = StabilityGate(REGIONS, timeout=TIMEOUT)
+    frame, waited, stable = gate.wait()
+    assert stable
+    assert waited < TIMEOUT
+
+def test_flicker_beyond_tolerance_never_settles(screen):
+    screen(0, noise=80)
+    gate = StabilityGate(REGIONS, timeout=0.2, tolerance=2)
+    frame, waited, stable = gate.wait()
+    assert not stable
+    assert waited <= 0.25
+
+def test_signature_regions_limit_what_must_settle(screen, monkeypatch):
+    blinking = screen(0, noise=0)
+    noisy = BlinkingScreen(0, noise=80, seed=1)
+    second = REGIONS[1]
+
+    def grab(region):
+        img = blinking.grab(region).copy()
+        y, x = second["top"] - region["top"], second["left"] - region["left"]
+        img[y:y + second["height"], x:x + second["width"]] = noisy.grab(second)
+        return img
+
+    monkeypatch.setattr(stability, "capture_region", grab)
+    gate = StabilityGate(REGIONS, signature_regions=REGIONS[:1], timeout=TIMEOUT)
+    frame, waited, stable = gate.wait()
+    assert stable
+
+def test_signatures_agree_uses_mean_difference():
+    frame = FrameSnapshot(np.full((200, 200, 3), 100, dtype=np.uint8), 0, 0)
+    brighter = FrameSnapshot(np.full((200, 200, 3), 104, dtype=np.uint8), 0, 0)
+    much_brighter = FrameSnapshot(np.full((200, 200, 3), 105, dtype=np.uint8), 0, 0)
+    signature = frame_signature(frame, REGIONS)
+    assert len(signature) == len(REGIONS) * stability.STABILITY_SIGNATURE_SIZE ** 2
+    assert signatures_agree(signature, frame_signature(brighter, REGIONS), tolerance=4)
+    assert not signatures_agree(signature, frame_signature(much_brighter, REGIONS), tolerance=4)
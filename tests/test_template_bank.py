@@ -0,0 +1,152 @@
+import tracemalloc
+
+import cv2
+import numpy as np
+import pytest
+
+import image_processing
+import reference_compare
+from config import (
+    MEDIA_FOLDER, CONTROLS, RANKS, DIVISIONS, MR_VALUES, CONTROL_REGIONS, RANK_REGIONS, DIVISION_REGIONS,
+    MR_REGIONS, CHARACTER_REGIONS, NAME_REGIONS, IMAGE_THRESHOLD, CHARACTER_THRESHOLD, NAME_THRESHOLD
+)
+from image_processing import SignatureIndex, TemplateBank, load_image
+
+def load_family(names, filename=lambda name: f"{name}.png"):
+    return {name: load_image(MEDIA_FOLDER / filename(name)) for name in names}
+
+def load_characters(side):
+    return {path.stem: load_image(path) for path in sorted((MEDIA_FOLDER / "characters" / side).glob("*.png"))}
+
+FAMILIES = {
+    "control": (lambda: load_family(CONTROLS), CONTROL_REGIONS[0], None, reference_compare.compare_images_no_threshold),
+    "control@image": (lambda: load_family(CONTROLS), CONTROL_REGIONS[0], IMAGE_THRESHOLD, reference_compare.compare_images),
+    "rank": (lambda: load_family(RANKS), RANK_REGIONS[0], IMAGE_THRESHOLD, reference_compare.compare_images),
+    "division": (lambda: load_family(DIVISIONS, lambda name: f"{name.lower()}.png"), DIVISION_REGIONS[0], None,
+                 reference_compare.compare_images_no_threshold),
+    "mr": (lambda: load_family(MR_VALUES), MR_REGIONS[0], IMAGE_THRESHOLD, reference_compare.compare_images),
+    "character": (lambda: load_characters("left"), CHARACTER_REGIONS[0], CHARACTER_THRESHOLD,
+                  reference_compare.compare_characters),
+}
+
+def live_captures(images, region, seed=0):
+    """ROIs a detector might see: every template as drawn on screen, noisy copies, blends and junk"""
+    rng = np.random.default_rng(seed)
+    size = (region["width"], region["height"])
+    shape = (region["height"], region["width"], 3)
+    drawn = [cv2.resize(img, size) for img in images.values()]
+    captures = list(drawn)
+    for img in drawn:
+        noise = rng.integers(-40, 41, shape)
+        captures.append(np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    for first, second in zip(drawn, drawn[1:] + drawn[:1]):
+        captures.append(cv2.addWeighted(first, 0.5, second, 0.5, 0))
+    captures.append(rng.integers(0, 256, shape, dtype=np.uint8))
+    captures.append(np.zeros(shape, dtype=np.uint8))
+    captures.append(np.full(shape, 255, dtype=np.uint8))
+    return captures
+
+@pytest.fixture(scope="module", params=sorted(FAMILIES))
+def family(request):
+    load, region, threshold, compare = FAMILIES[request.param]
+    images = load()
+    return images, TemplateBank(images, region, threshold), compare, region
+
+def test_bank_matches_the_reference_loop(family):
+    images, bank, compare, region = family
+    for img in live_captures(images, region):
+        name, similarity = reference_compare.best_match(compare, img, images)
+        result = bank.match(img)
+        assert result.name == name
+        assert result.similarity == pytest.approx(similarity, abs=1e-12)
+
+def test_runner_up_is_the_reference_second_best(family):
+    images, bank, compare, region = family
+    for img in live_captures(images, region, seed=1)[len(images):]:
+        scores = sorted(((compare(img, template), -index, name) for index, (name, template) in enumerate(images.items())),
+                        reverse=True)
+        result = bank.match(img)
+        if scores[0][0] <= 0:
+            continue
+        assert result.runner_up == scores[1][2]
+        assert result.runner_up_similarity == pytest.approx(scores[1][0], abs=1e-12)
+        assert result.margin == pytest.approx(scores[0][0] - scores[1][0], abs=1e-12)
+
+def test_batch_similarities_match_single_scores(family):
+    images, bank, compare, region = family
+    captures = live_captures(images, region, seed=2)[:6]
+    batch = bank.batch_similarities(captures)
+    for row, img in zip(batch, captures):
+        expected = [compare(img, template) for template in images.values()]
+        assert row == pytest.approx(np.maximum(expected, 0), abs=1e-12)
+
+def test_name_bank_matches_compare_names():
+    region = NAME_REGIONS[0]
+    rng = np.random.default_rng(3)
+    accounts = {}
+    for index in range(3):
+        gray = rng.integers(0, 256, (region["height"], region["width"]), dtype=np.uint8)
+        _, accounts[f"account_{index}"] = cv2.threshold(gray, NAME_THRESHOLD, 255, cv2.THRESH_BINARY)
+    bank = TemplateBank(accounts, region, NAME_THRESHOLD)
+    for img in live_captures({name: cv2.cvtColor(binary, cv2.COLOR_GRAY2BGR) for name, binary in accounts.items()}, region):
+        expected = reference_compare.best_match(lambda live, saved: reference_compare.compare_names(saved, live), img, accounts)
+        assert bank.best_match(img) == (expected[0], pytest.approx(expected[1], abs=1e-12))
+
+def test_packed_bank_round_trips(family):
+    images, bank, compare, region = family
+    if bank.packed is None:
+        pytest.skip("grayscale family")
+    rebuilt = TemplateBank.from_packed(bank.names, region, bank.threshold, bank.packed)
+    for img in live_captures(images, region, seed=4)[:5]:
+        assert rebuilt.best_match(img) == bank.best_match(img)
+
+def test_steady_state_match_allocates_no_arrays(family):
+    images, bank, compare, region = family
+    captures = live_captures(images, region, seed=5)
+    tracemalloc.start()
+    try:
+        for img in captures:
+            bank.match(img)
+        for img in captures:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            bank.match(img)
+            # Only the result object and NumPy's iterator bookkeeping, whatever the bank's size
+            assert tracemalloc.get_traced_memory()[1] - before < 1024
+    finally:
+        tracemalloc.stop()
+
+def shifted_captures(images, region, offsets=((0, 2), (1, -1), (-2, 0))):
+    """Templates drawn a few pixels off the region, as a slightly misaligned capture sees them"""
+    size = (region["width"], region["height"])
+    captures = []
+    for img in images.values():
+        drawn = cv2.resize(img, size)
+        for dy, dx in offsets:
+            captures.append(np.roll(drawn, (dy, dx), axis=(0, 1)))
+    return captures
+
+@pytest.mark.parametrize("side", ["left", "right"])
+def test_signature_index_matches_exhaustive_search(side):
+    images = load_characters(side)
+    region = CHARACTER_REGIONS[0 if side == "left" else 1]
+    bank = TemplateBank(images, region, CHARACTER_THRESHOLD)
+    index = SignatureIndex(bank)
+    captures = live_captures(images, region, seed=6) + shifted_captures(images, region)
+    for img in captures:
+        expected = bank.match(img)
+        result = index.match(img)
+        assert (result.name, result.runner_up) == (expected.name, expected.runner_up)
+        assert result.similarity == expected.similarity
+        assert result.runner_up_similarity == expected.runner_up_similarity
+        assert result.name == reference_compare.best_match(reference_compare.compare_characters, img, images)[0]
+    assert index.stats()["average_scored"] < len(bank)
+
+def test_small_banks_are_searched_exhaustively(monkeypatch):
+    bank = TemplateBank(load_characters("left"), CHARACTER_REGIONS[0], CHARACTER_THRESHOLD)
+    assert SignatureIndex.for_bank(bank) is bank
+    monkeypatch.setattr(image_processing, "SIGNATURE_INDEX_MIN_TEMPLATES", len(bank))
+    assert isinstance(SignatureIndex.for_bank(bank), SignatureIndex)
+    # Grayscale banks have no bit-packed templates to index
+    grayscale = TemplateBank(load_family(CONTROLS), CONTROL_REGIONS[0])
+    assert SignatureIndex.for_bank(grayscale) is grayscale
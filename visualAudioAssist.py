@@ -1,22 +1,32 @@
-import time
 import platform
 import config
 
 from config import (
-    MEDIA_FOLDER, ENABLE_HEALTH_MONITORING, ENABLE_TRAINING_MENU,
+    MEDIA_FOLDER, ENABLE_HEALTH_MONITORING, ENABLE_TRAINING_MENU, ENABLE_GAUGE_TIMELINE,
     CHECK_INTERVAL, COOLDOWN_PERIOD, CONTROLS, RANKS, DIVISIONS, MR_VALUES,
-    load_training_menu_config, get_exe_directory
+    HEALTH_CHECK_INTERVAL, HEALTH_CONFIRMATION_DELAY, MATCH_CHECK_INTERVAL,
+    GAUGE_SAMPLE_INTERVAL, HEALTH_BAR_REGIONS,
+    CAPTURE_CACHE_PATH, ENABLE_CAPTURE_THREAD, HEALTH_REGIONS,
+    CAPTURE_RECORD_PATH, CAPTURE_REPLAY_PATH, CAPTURE_REPLAY_REALTIME,
+    CONTROL_REGIONS, RANK_REGIONS, DIVISION_REGIONS, MR_REGIONS, CHARACTER_REGIONS,
+    IMAGE_THRESHOLD, CHARACTER_THRESHOLD, CONTROL_SIMILARITY_THRESHOLD, ADD_NAME_ACCOUNT,
+    MIN_RANK_THRESHOLD, MIN_DIVISION_THRESHOLD, MIN_MR_THRESHOLD,
+    load_training_menu_config
 )
-from image_processing import load_image, load_image_from_path
-from vs_screen import handle_vs_screen_detection
-from health import handle_health_monitoring
-from training_menu import handle_training_menu
+from capture import open_capture_session, start_frame_grabber, stop_frame_grabber
+from replay import ReplayFinished
+from detection_cache import cache_stats
+from classifier import FrequencyClassifier, classifier_stats, load_match_frequencies, save_match_frequencies
+from scheduler import Scheduler
+from modes import ModeMachine, IDLE, MATCH
+from image_processing import load_image, TemplateBank, SignatureIndex
+from vs_screen import handle_vs_screen_detection, vs_stability_stats, VS_SCREEN_REGIONS
+from health import HealthState, handle_match_start, handle_health_check, record_health_gauges, health_sampler_stats
+from training_menu import MenuState, handle_training_menu
+from option_detection import preload_option_references
 from wizards import name_capture_wizard
-
-def load_player_name_image():
-    exe_dir = get_exe_directory()
-    name_path = exe_dir / "MyName.png"
-    return load_image_from_path(name_path) if name_path.exists() else None
+from name_bank import load_name_bank
+from audio import preload_audio, audio_cache_stats, shutdown_audio
 
 def load_game_images():
     print("Loading control images...")
@@ -43,18 +53,27 @@ def load_game_images():
         mr_images[mr_value] = load_image(MEDIA_FOLDER / f"{mr_value}.png")
     print(f"Loaded {len(mr_images)} MR images\n")
     
-    return control_images, rank_images, division_images, mr_images
+    return (
+        FrequencyClassifier("control", TemplateBank(control_images, CONTROL_REGIONS[0]), CONTROL_SIMILARITY_THRESHOLD),
+        FrequencyClassifier("rank", TemplateBank(rank_images, RANK_REGIONS[0], IMAGE_THRESHOLD), MIN_RANK_THRESHOLD),
+        FrequencyClassifier("division", TemplateBank(division_images, DIVISION_REGIONS[0]), MIN_DIVISION_THRESHOLD),
+        FrequencyClassifier("mr", TemplateBank(mr_images, MR_REGIONS[0], IMAGE_THRESHOLD), MIN_MR_THRESHOLD)
+    )
 
 def load_character_images():
     print("Loading character images...")
     character_images = {"left": {}, "right": {}}
+    character_templates = {
+        "left": TemplateBank({}, CHARACTER_REGIONS[0], CHARACTER_THRESHOLD),
+        "right": TemplateBank({}, CHARACTER_REGIONS[1], CHARACTER_THRESHOLD)
+    }
     
     left_dir = MEDIA_FOLDER / "characters" / "left"
     right_dir = MEDIA_FOLDER / "characters" / "right"
     
     if not left_dir.exists() or not right_dir.exists():
         print("Warning: Character directories not found. Character detection disabled.\n")
-        return character_images
+        return character_templates
     
     for img_path in left_dir.glob("*.png"):
         char_name = img_path.stem
@@ -73,7 +92,10 @@ def load_character_images():
     print(f"Loaded {len(character_images['left'])} left-side character images")
     print(f"Loaded {len(character_images['right'])} right-side character images\n")
     
-    return character_images
+    return {
+        "left": SignatureIndex.for_bank(TemplateBank(character_images["left"], CHARACTER_REGIONS[0], CHARACTER_THRESHOLD)),
+        "right": SignatureIndex.for_bank(TemplateBank(character_images["right"], CHARACTER_REGIONS[1], CHARACTER_THRESHOLD))
+    }
 
 def setup_training_menu():
     if not ENABLE_TRAINING_MENU:
@@ -82,17 +104,18 @@ def setup_training_menu():
     if not load_training_menu_config():
         return False, None, None
     
-    if config.training_menu_config is None:
+    if config.training_menu_model is None:
         print("Training menu config is None after loading")
         return False, None, None
     
     try:
         menu_ref_img = load_image(
-            MEDIA_FOLDER / config.training_menu_config["tab_detection"]["reference_image"]
+            MEDIA_FOLDER / config.training_menu_model.menu_reference_image
         )
         submenu_ref_img = load_image(
-            MEDIA_FOLDER / config.training_menu_config["submenu_detection"]["reference_image"]
+            MEDIA_FOLDER / config.training_menu_model.submenu_reference_image
         )
+        preload_option_references(config.training_menu_model)
         print("Training menu monitoring enabled\n")
         return True, menu_ref_img, submenu_ref_img
     except Exception as e:
@@ -106,115 +129,161 @@ def main():
     print("="*60 + "\n")
     
     try:
-        control_images, rank_images, division_images, mr_images = load_game_images()
-        character_images = load_character_images()
+        control_templates, rank_templates, division_templates, mr_templates = load_game_images()
+        character_templates = load_character_images()
     except Exception as e:
         print(f"Error loading images: {e}")
         return
+    load_match_frequencies()
     
-    player_name_img = load_player_name_image()
-    if player_name_img is None:
-        if not name_capture_wizard(control_images):
+    preload_audio()
+    
+    try:
+        capture_session = open_capture_session(
+            CAPTURE_CACHE_PATH, CAPTURE_REPLAY_PATH, CAPTURE_REPLAY_REALTIME
+        )
+    except Exception as e:
+        print(f"Error opening screen capture: {e}")
+        return
+    
+    name_templates = load_name_bank()
+    if name_templates is None or ADD_NAME_ACCOUNT:
+        if not name_capture_wizard(control_templates):
             print("Setup failed. Exiting.")
+            capture_session.close()
             return
-        player_name_img = load_player_name_image()
-    else:
-        print("Player name image found: MyName.png\n")
+        name_templates = load_name_bank()
+    print(f"Player name bank: {len(name_templates)} account(s)\n")
     
     training_menu_enabled, menu_ref_img, submenu_ref_img = setup_training_menu()
     
     print(f"Monitoring on {platform.system()}...")
-    print(f"Check interval: {CHECK_INTERVAL} seconds")
+    print(f"VS screen check interval: {CHECK_INTERVAL} seconds")
     print(f"Audio cooldown: {COOLDOWN_PERIOD} seconds")
     if ENABLE_HEALTH_MONITORING:
         print(f"Health monitoring: Enabled")
+    if ENABLE_HEALTH_MONITORING and ENABLE_GAUGE_TIMELINE:
+        print(f"Health gauge timeline: Enabled (uncalibrated, {1 / GAUGE_SAMPLE_INTERVAL:.0f} samples/s during matches)")
     if training_menu_enabled:
         print(f"Training menu: Enabled")
-    if character_images["left"] or character_images["right"]:
+    if len(character_templates["left"]) or len(character_templates["right"]):
         print(f"Character detection: Enabled")
     print("Press Ctrl+C to stop\n")
     
+    # Only the health checks poll as often as the grabber, so outside a match the
+    # detectors grab their own small regions and the grabber sits idle
+    mode_grab_regions = {MATCH: HEALTH_REGIONS + (HEALTH_BAR_REGIONS if ENABLE_GAUGE_TIMELINE else [])}
+    frame_grabber = None
+    if CAPTURE_RECORD_PATH and not CAPTURE_REPLAY_PATH:
+        # A replay has to drive every detector, so a recording grabs all of their regions in every mode
+        grab_regions = HEALTH_REGIONS + HEALTH_BAR_REGIONS + VS_SCREEN_REGIONS
+        if training_menu_enabled:
+            grab_regions = grab_regions + list(config.training_menu_model.panel_regions)
+        frame_grabber = start_frame_grabber(grab_regions, CAPTURE_RECORD_PATH)
+        print(f"Recording frames to {CAPTURE_RECORD_PATH}\n")
+    elif ENABLE_CAPTURE_THREAD and not CAPTURE_REPLAY_PATH:
+        frame_grabber = start_frame_grabber(mode_grab_regions.get(IDLE))
+    
     last_audio_time = 0
-    current_mode = "idle"
-    
-    health_state = {
-        'active': False,
-        'alert_states': {
-            "left": {"alert_played": False},
-            "right": {"alert_played": False}
-        },
-        'last_health_check_time': 0,
-        'last_match_check_time': 0,
-        'match_end_check_pending': False,
-        'match_end_check_time': 0
-    }
+    modes = ModeMachine()
+    health_state = HealthState()
+    menu_state = MenuState()
+    scheduler = Scheduler(clock=capture_session.now)
     
-    menu_state = {
-        'last_selected_item': None,
-        'last_item_position': None,
-        'last_active_tab': None,
-        'last_active_sub_tab': None,
-        'was_open': False,
-        'initial_check_done': False,
-        'sub_tab_announced': False,
-        'in_submenu': False,
-        'last_announced_option': None
-    }
+    def run_match_start(current_time):
+        event = handle_match_start(current_time, health_state)
+        if event:
+            modes.handle(event)
+    
+    def run_health_check(current_time):
+        event = handle_health_check(current_time, health_state)
+        if event:
+            modes.handle(event)
+    
+    def run_gauge_sample(current_time):
+        record_health_gauges()
+    
+    def run_vs_screen(current_time):
+        nonlocal last_audio_time
+        vs_detected, new_mode, last_audio_time = handle_vs_screen_detection(
+            current_time, last_audio_time, control_templates, name_templates,
+            rank_templates, division_templates, mr_templates, character_templates
+        )
+        modes.handle("vs_detected" if vs_detected else "vs_lost")
+    
+    def run_training_menu(current_time):
+        menu_open = handle_training_menu(
+            menu_state, config.training_menu_model, 
+            menu_ref_img, submenu_ref_img
+        )
+        modes.handle("menu_opened" if menu_open else "menu_closed")
+    
+    if ENABLE_HEALTH_MONITORING:
+        scheduler.register("match_start", MATCH_CHECK_INTERVAL, run_match_start,
+                           when=lambda: modes.allows("match_start"))
+        scheduler.register("health", HEALTH_CHECK_INTERVAL, run_health_check,
+                           when=lambda: modes.allows("health"))
+        scheduler.register("health_confirm", HEALTH_CONFIRMATION_DELAY, run_health_check,
+                           when=lambda: modes.allows("health") and health_state.confirming())
+        if ENABLE_GAUGE_TIMELINE:
+            scheduler.register("gauges", GAUGE_SAMPLE_INTERVAL, run_gauge_sample,
+                               when=lambda: modes.allows("gauges"))
+    scheduler.register("vs_screen", CHECK_INTERVAL, run_vs_screen,
+                       when=lambda: modes.allows("vs_screen"))
+    if training_menu_enabled:
+        scheduler.register("training_menu", config.training_menu_model.settings["menu_check_interval"],
+                           run_training_menu, when=lambda: modes.allows("training_menu"))
     
+    grabbed_mode = IDLE
     try:
         while True:
-            current_time = time.time()
-            
-            if ENABLE_HEALTH_MONITORING:
-                new_mode = handle_health_monitoring(current_time, health_state)
-                if new_mode:
-                    current_mode = new_mode
-                    if new_mode == 'idle':
-                        vs_detected, vs_mode, last_audio_time = handle_vs_screen_detection(
-                            current_time, last_audio_time, control_images, player_name_img,
-                            rank_images, division_images, mr_images, character_images
-                        )
-                        if vs_detected:
-                            current_mode = 'vs_screen'
-                
-                if not health_state['active'] and current_mode in ["vs_screen", "idle"]:
-                    vs_detected, new_mode, last_audio_time = handle_vs_screen_detection(
-                        current_time, last_audio_time, control_images, player_name_img,
-                        rank_images, division_images, mr_images, character_images
-                    )
-                    
-                    if vs_detected:
-                        current_mode = 'vs_screen'
-                    elif current_mode == "vs_screen":
-                        current_mode = "idle"
-            
-            else:
-                if current_mode in ["vs_screen", "idle"]:
-                    vs_detected, new_mode, last_audio_time = handle_vs_screen_detection(
-                        current_time, last_audio_time, control_images, player_name_img,
-                        rank_images, division_images, mr_images, character_images
-                    )
-                    
-                    if vs_detected:
-                        current_mode = 'vs_screen'
-                    elif current_mode == "vs_screen":
-                        current_mode = "idle"
-            
-            if training_menu_enabled and current_mode in ["training_menu", "idle"]:
-                menu_open = handle_training_menu(
-                    menu_state, config.training_menu_config, 
-                    menu_ref_img, submenu_ref_img
-                )
-                
-                if menu_open:
-                    current_mode = "training_menu"
-                elif current_mode == "training_menu":
-                    current_mode = "idle"
-            
-            time.sleep(CHECK_INTERVAL)
+            capture_session.next_tick()
+            scheduler.run_pending()
+            if frame_grabber and not frame_grabber.recorder and modes.mode != grabbed_mode:
+                grabbed_mode = modes.mode
+                frame_grabber.retarget(mode_grab_regions.get(grabbed_mode))
+            if capture_session.realtime:
+                scheduler.sleep_until_next()
     
     except KeyboardInterrupt:
         print("\n\nMonitoring stopped.")
+    except ReplayFinished:
+        replay_health = capture_session.health()
+        print(f"\n\nReplay finished: {replay_health['ticks']} ticks in {replay_health['elapsed']:.1f}s "
+              f"({replay_health['ticks_per_second']:.1f} frames/s)")
+    finally:
+        if frame_grabber:
+            grabber_stats = frame_grabber.stats()
+            print(f"Background frames: {grabber_stats['frames']} ({grabber_stats['dropped']} dropped)")
+            if grabber_stats["recorded"]:
+                print(f"Recorded frames: {grabber_stats['recorded']} ({grabber_stats['recorded_bytes'] / 1024 / 1024:.1f} MB)")
+            stop_frame_grabber()
+        for task_name, stats in scheduler.stats().items():
+            print(f"Detector '{task_name}': {stats['runs']} runs, {stats['missed']} missed deadlines, "
+                  f"jitter {stats['mean_jitter'] * 1000:.0f}ms avg / {stats['max_jitter'] * 1000:.0f}ms max")
+        gauge_stats = health_sampler_stats()
+        if gauge_stats["samples"]:
+            print(f"Health gauge samples: {gauge_stats['samples']} ({gauge_stats['samples_per_second']:.1f}/s)")
+        for family, stats in classifier_stats().items():
+            if stats["calls"]:
+                print(f"Classifier '{family}': {stats['calls']} calls, {stats['average_scored']:.1f} of "
+                      f"{stats['candidates']} candidates scored on average, {stats['early_exits']} early exits")
+        if not CAPTURE_REPLAY_PATH:
+            save_match_frequencies()
+        stability_stats = vs_stability_stats()
+        if stability_stats["waits"]:
+            print(f"VS blink waits: {stability_stats['waits']} ({stability_stats['timeouts']} timed out), "
+                  f"{stability_stats['average_wait'] * 1000:.0f}ms avg")
+        for cache_name, stats in cache_stats().items():
+            print(f"Detection cache '{cache_name}': {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate'] * 100:.0f}% hit rate)")
+        audio_stats = audio_cache_stats()
+        print(f"Audio cache: {audio_stats['pinned'] + audio_stats['cached']} clips, "
+              f"{audio_stats['bytes'] / 1024 / 1024:.1f} MB, {audio_stats['hit_rate'] * 100:.0f}% hit rate")
+        capture_health = capture_session.health()
+        print(f"Screen captures: {capture_health['captures']} ({capture_health['failures']} failed)")
+        capture_session.close()
+        shutdown_audio(wait=False)
 
 if __name__ == "__main__":
     main()
@@ -1,99 +1,105 @@
 import time
-from capture import capture_region
-from image_processing import (
-    compare_images_no_threshold, compare_names, compare_images, 
-    compare_characters, check_control_color
-)
-from audio import play_audio_sequence
+from concurrent.futures import ThreadPoolExecutor
+from capture import capture_snapshot, capture_from
+from image_processing import check_control_color
+from audio import Announcement
+from stability import StabilityGate
+from name_bank import match_player_name
 from config import (
     CONTROL_REGIONS, CONTROL_COLOR_REGIONS, RANK_REGIONS, NAME_REGIONS,
     DIVISION_REGIONS, MR_REGIONS, CHARACTER_REGIONS, CONTROL_SIMILARITY_THRESHOLD,
     MIN_RANK_THRESHOLD, MIN_DIVISION_THRESHOLD, MIN_MR_THRESHOLD, 
-    MIN_CHARACTER_THRESHOLD, RANKS_WITH_DIVISIONS, COOLDOWN_PERIOD, VS_SCREEN_WAIT_TIME
+    MIN_CHARACTER_THRESHOLD, RANKS_WITH_DIVISIONS, COOLDOWN_PERIOD, VS_SCREEN_WAIT_TIME,
+    IMAGE_THRESHOLD, VS_EXTRACTION_WORKERS
+)
+
+VS_SCREEN_REGIONS = (
+    CONTROL_REGIONS + CONTROL_COLOR_REGIONS + NAME_REGIONS + CHARACTER_REGIONS +
+    RANK_REGIONS + DIVISION_REGIONS + MR_REGIONS
+)
+
+# Each stage scores a different TemplateBank, so they never share scratch buffers
+# The blink hits the whole screen; the static UI labels are enough to see it end
+_vs_stability_gate = StabilityGate(
+    VS_SCREEN_REGIONS, CONTROL_REGIONS + NAME_REGIONS + RANK_REGIONS, timeout=VS_SCREEN_WAIT_TIME
 )
 
-def find_best_rank_match(captured_img, rank_images):
-    best_match = None
-    best_similarity = 0
-    for rank_name, rank_img in rank_images.items():
-        similarity = compare_images(captured_img, rank_img)
-        if similarity > best_similarity:
-            best_similarity = similarity
-            best_match = rank_name
+_extraction_pool = ThreadPoolExecutor(max_workers=VS_EXTRACTION_WORKERS, thread_name_prefix="vs-extract")
+
+def find_best_rank_match(captured_img, rank_templates):
+    best_match, best_similarity = rank_templates.best_match(captured_img)
     if best_similarity < MIN_RANK_THRESHOLD:
         return "Unknown", best_similarity
     return best_match, best_similarity
 
-def find_best_division_match(captured_img, division_images):
-    best_match = None
-    best_similarity = 0
-    for division_name, division_img in division_images.items():
-        similarity = compare_images_no_threshold(captured_img, division_img)
-        if similarity > best_similarity:
-            best_similarity = similarity
-            best_match = division_name
+def find_best_division_match(captured_img, division_templates):
+    best_match, best_similarity = division_templates.best_match(captured_img)
     if best_similarity < MIN_DIVISION_THRESHOLD:
         return None, best_similarity
     return best_match, best_similarity
 
-def find_best_mr_match(captured_img, mr_images):
-    best_match = None
-    best_similarity = 0
-    for mr_value, mr_img in mr_images.items():
-        similarity = compare_images(captured_img, mr_img)
-        if similarity > best_similarity:
-            best_similarity = similarity
-            best_match = mr_value
+def find_best_mr_match(captured_img, mr_templates):
+    best_match, best_similarity = mr_templates.best_match(captured_img)
     if best_similarity < MIN_MR_THRESHOLD:
         return None, best_similarity
     return best_match, best_similarity
 
-def find_best_character_match(captured_img, character_images):
-    best_match = None
-    best_similarity = 0
-    for character_name, character_img in character_images.items():
-        similarity = compare_characters(captured_img, character_img)
-        if similarity > best_similarity:
-            best_similarity = similarity
-            best_match = character_name
+def find_best_character_match(captured_img, character_templates):
+    best_match, best_similarity = character_templates.best_match(captured_img)
     if best_similarity < MIN_CHARACTER_THRESHOLD:
         return None, best_similarity
     return best_match, best_similarity
 
-def detect_control_via_image(region, control_images):
+def vs_stability_stats():
+    return _vs_stability_gate.stats()
+
+def timed_match(finder, frame, region, templates):
+    start = time.perf_counter()
+    match, similarity = finder(frame.region(region), templates)
+    return match, similarity, time.perf_counter() - start
+
+def extract_opponent_attributes(frame, opponent_side, character_templates, rank_templates, division_templates, mr_templates):
+    """Start character, rank, MR and division matching for the opponent side at once; MR and division are speculative"""
+    side_index = 0 if opponent_side == "left" else 1
+    return {
+        "character": _extraction_pool.submit(
+            timed_match, find_best_character_match, frame, CHARACTER_REGIONS[side_index], character_templates[opponent_side]
+        ),
+        "rank": _extraction_pool.submit(timed_match, find_best_rank_match, frame, RANK_REGIONS[side_index], rank_templates),
+        "mr": _extraction_pool.submit(timed_match, find_best_mr_match, frame, MR_REGIONS[side_index], mr_templates),
+        "division": _extraction_pool.submit(
+            timed_match, find_best_division_match, frame, DIVISION_REGIONS[side_index], division_templates
+        ),
+    }
+
+def format_stage_timings(timings):
+    return ", ".join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in timings.items())
+
+def detect_control_via_image(region, control_templates, frame=None):
     try:
-        screen_img = capture_region(region)
-        best_control = None
-        best_similarity = 0
-        for control_name, control_img in control_images.items():
-            similarity = compare_images(screen_img, control_img)
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_control = control_name
+        screen_img = capture_from(frame, region)
+        image_templates = control_templates.with_threshold(IMAGE_THRESHOLD, 0.85)
+        best_control, best_similarity = image_templates.best_match(screen_img)
         
         if best_similarity >= 0.85:
+            image_templates.record(best_control)
             return best_control, best_similarity
         return None, best_similarity
     except Exception as e:
         print(f"  Error in image fallback detection: {e}")
         return None, 0.0
 
-def handle_vs_screen_detection(current_time, last_audio_time, control_images, 
-                               player_name_img, rank_images, division_images, mr_images, character_images):
+def handle_vs_screen_detection(current_time, last_audio_time, control_templates, 
+                               name_templates, rank_templates, division_templates, mr_templates, character_templates):
     left_region = CONTROL_REGIONS[0]
     right_region = CONTROL_REGIONS[1]
     left_color_region = CONTROL_COLOR_REGIONS[0]
     right_color_region = CONTROL_COLOR_REGIONS[1]
     
     try:
-        screen_img = capture_region(left_region)
-        best_control = None
-        best_similarity = 0
-        for control_name, control_img in control_images.items():
-            similarity = compare_images_no_threshold(screen_img, control_img)
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_control = control_name
+        frame = capture_snapshot(CONTROL_REGIONS)
+        screen_img = frame.region(left_region)
+        best_control, best_similarity = control_templates.best_match(screen_img)
         
         if best_similarity < CONTROL_SIMILARITY_THRESHOLD:
             return False, None, last_audio_time
@@ -103,14 +109,8 @@ def handle_vs_screen_detection(current_time, last_audio_time, control_images,
     
     vs_detected_right = False
     try:
-        screen_img = capture_region(right_region)
-        best_control = None
-        best_similarity = 0
-        for control_name, control_img in control_images.items():
-            similarity = compare_images_no_threshold(screen_img, control_img)
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_control = control_name
+        screen_img = frame.region(right_region)
+        best_control, best_similarity = control_templates.best_match(screen_img)
         
         if best_similarity >= CONTROL_SIMILARITY_THRESHOLD:
             vs_detected_right = True
@@ -133,16 +133,17 @@ def handle_vs_screen_detection(current_time, last_audio_time, control_images,
         return True, 'vs_screen', last_audio_time
     
     try:
-        print(f"Waiting {VS_SCREEN_WAIT_TIME} second(s) to avoid screen blink...")
-        time.sleep(VS_SCREEN_WAIT_TIME)
+        print(f"Waiting up to {VS_SCREEN_WAIT_TIME} second(s) for the screen blink to settle...")
         
         try:
-            left_screen_img = capture_region(left_region)
-            best_similarity = 0
-            for control_name, control_img in control_images.items():
-                similarity = compare_images_no_threshold(left_screen_img, control_img)
-                if similarity > best_similarity:
-                    best_similarity = similarity
+            frame, waited, stable = _vs_stability_gate.wait()
+            detection_start = time.perf_counter()
+            if stable:
+                print(f"Screen stable after {waited * 1000:.0f}ms ({(VS_SCREEN_WAIT_TIME - waited) * 1000:.0f}ms saved)")
+            else:
+                print(f"Screen still changing after {waited * 1000:.0f}ms, using newest frame")
+            left_screen_img = frame.region(left_region)
+            _, best_similarity = control_templates.best_match(left_screen_img)
             
             if best_similarity < CONTROL_SIMILARITY_THRESHOLD:
                 print("VS screen disappeared during wait, skipping...")
@@ -157,13 +158,13 @@ def handle_vs_screen_detection(current_time, last_audio_time, control_images,
         right_control = None
         
         try:
-            color_img = capture_region(left_color_region)
+            color_img = frame.region(left_color_region)
             left_control = check_control_color(color_img)
             if left_control:
                 print(f"  Left: {left_control} [via color]")
             else:
                 print(f"  Left: Color detection failed, trying image comparison...")
-                left_control, sim = detect_control_via_image(left_region, control_images)
+                left_control, sim = detect_control_via_image(left_region, control_templates, frame)
                 if left_control:
                     print(f"  Left: {left_control} [via image, {sim*100:.1f}%]")
                 else:
@@ -172,7 +173,7 @@ def handle_vs_screen_detection(current_time, last_audio_time, control_images,
         except Exception as e:
             print(f"  Left: Color detection error: {e}")
             print(f"  Left: Trying image comparison fallback...")
-            left_control, sim = detect_control_via_image(left_region, control_images)
+            left_control, sim = detect_control_via_image(left_region, control_templates, frame)
             if left_control:
                 print(f"  Left: {left_control} [via image, {sim*100:.1f}%]")
             else:
@@ -181,13 +182,13 @@ def handle_vs_screen_detection(current_time, last_audio_time, control_images,
         
         if vs_detected_right:
             try:
-                color_img = capture_region(right_color_region)
+                color_img = frame.region(right_color_region)
                 right_control = check_control_color(color_img)
                 if right_control:
                     print(f"  Right: {right_control} [via color]")
                 else:
                     print(f"  Right: Color detection failed, trying image comparison...")
-                    right_control, sim = detect_control_via_image(right_region, control_images)
+                    right_control, sim = detect_control_via_image(right_region, control_templates, frame)
                     if right_control:
                         print(f"  Right: {right_control} [via image, {sim*100:.1f}%]")
                     else:
@@ -196,7 +197,7 @@ def handle_vs_screen_detection(current_time, last_audio_time, control_images,
             except Exception as e:
                 print(f"  Right: Color detection error: {e}")
                 print(f"  Right: Trying image comparison fallback...")
-                right_control, sim = detect_control_via_image(right_region, control_images)
+                right_control, sim = detect_control_via_image(right_region, control_templates, frame)
                 if right_control:
                     print(f"  Right: {right_control} [via image, {sim*100:.1f}%]")
                 else:
@@ -208,108 +209,127 @@ def handle_vs_screen_detection(current_time, last_audio_time, control_images,
         opponent_control = None
         
         try:
-            left_name_img = capture_region(NAME_REGIONS[0])
-            right_name_img = capture_region(NAME_REGIONS[1])
-            
-            left_name_similarity = compare_names(player_name_img, left_name_img)
-            right_name_similarity = compare_names(player_name_img, right_name_img)
+            (left_account, left_name_similarity), (right_account, right_name_similarity) = match_player_name(
+                name_templates, frame
+            )
             
             print(f"Name similarity - Left side: {left_name_similarity * 100:.1f}% | Right side: {right_name_similarity * 100:.1f}%")
             
             if left_name_similarity > right_name_similarity:
                 opponent_side = "right"
                 opponent_control = right_control if right_control else left_control
-                print(f"Player detected on LEFT, opponent on RIGHT")
+                print(f"Player '{left_account}' detected on LEFT, opponent on RIGHT")
                 print(f"Opponent control: {opponent_control}")
             else:
                 opponent_side = "left"
                 opponent_control = left_control
-                print(f"Player detected on RIGHT, opponent on LEFT")
+                print(f"Player '{right_account}' detected on RIGHT, opponent on LEFT")
                 print(f"Opponent control: {opponent_control}")
         except Exception as e:
             print(f"Error in name detection: {e}")
             print(f"{'='*60}\n")
             return True, 'vs_screen', last_audio_time
         
-        print("\nCapturing opponent character region...")
-        opponent_character_region = CHARACTER_REGIONS[0] if opponent_side == "left" else CHARACTER_REGIONS[1]
-        
-        opponent_character = None
-        try:
-            opponent_character_img = capture_region(opponent_character_region)
-            opponent_character, char_sim = find_best_character_match(opponent_character_img, character_images[opponent_side])
-            if opponent_character:
-                print(f"Opponent character: {opponent_character} ({char_sim * 100:.1f}%)")
-            else:
-                print(f"No character match found (best: {char_sim * 100:.1f}%)")
-        except Exception as e:
-            print(f"Error capturing character: {e}")
-        
-        print("\nCapturing opponent rank region...")
-        opponent_rank_region = RANK_REGIONS[0] if opponent_side == "left" else RANK_REGIONS[1]
-        
+        # Clips start playing as each attribute resolves; order stays control, character, rank
+        announcement = Announcement() if opponent_control else None
         try:
-            opponent_rank_img = capture_region(opponent_rank_region)
-            opponent_rank, opponent_sim = find_best_rank_match(opponent_rank_img, rank_images)
-            print(f"Opponent rank: {opponent_rank} ({opponent_sim * 100:.1f}%)")
+            if announcement:
+                announcement.add(f"{opponent_control}.ogg")
             
-            division = None
-            mr_value = None
+            extraction_start = time.perf_counter()
+            stages = extract_opponent_attributes(
+                frame, opponent_side, character_templates, rank_templates, division_templates, mr_templates
+            )
+            timings = {}
             
-            if opponent_rank == "Master":
-                print(f"\nMaster rank detected, checking MR region...")
-                try:
-                    mr_region = MR_REGIONS[0] if opponent_side == "left" else MR_REGIONS[1]
-                    mr_img = capture_region(mr_region)
-                    mr_value, mr_sim = find_best_mr_match(mr_img, mr_images)
-                    if mr_value:
-                        print(f"MR detected: {mr_value} ({mr_sim * 100:.1f}%)")
-                    else:
-                        print(f"No MR match found (best: {mr_sim * 100:.1f}%), using base Master")
-                except Exception as e:
-                    print(f"Error capturing MR: {e}, using base Master")
-            elif opponent_rank in RANKS_WITH_DIVISIONS and opponent_rank != "Unknown":
-                print(f"\nRank requires division check, capturing division region...")
-                try:
-                    division_region = DIVISION_REGIONS[0] if opponent_side == "left" else DIVISION_REGIONS[1]
-                    division_img = capture_region(division_region)
-                    division, div_sim = find_best_division_match(division_img, division_images)
-                    if division:
-                        print(f"Division detected: {division} ({div_sim * 100:.1f}%)")
-                    else:
-                        print(f"No division match found (best: {div_sim * 100:.1f}%), using base rank")
-                except Exception as e:
-                    print(f"Error capturing division: {e}, using base rank")
+            print("\nCapturing opponent character region...")
+            opponent_character = None
+            try:
+                opponent_character, char_sim, timings["character"] = stages["character"].result()
+                if opponent_character:
+                    print(f"Opponent character: {opponent_character} ({char_sim * 100:.1f}%)")
+                else:
+                    print(f"No character match found (best: {char_sim * 100:.1f}%)")
+            except Exception as e:
+                print(f"Error capturing character: {e}")
+            
+            if announcement and opponent_character:
+                announcement.add(f"characters/{opponent_character}.ogg")
             
-            if opponent_control:
-                audio_files = [f"{opponent_control}.ogg"]
+            print("\nCapturing opponent rank region...")
+            
+            try:
+                opponent_rank, opponent_sim, timings["rank"] = stages["rank"].result()
+                print(f"Opponent rank: {opponent_rank} ({opponent_sim * 100:.1f}%)")
+                if opponent_rank != "Unknown":
+                    rank_templates.record(opponent_rank)
                 
-                if opponent_character:
-                    audio_files.append(f"characters/{opponent_character}.ogg")
+                division = None
+                mr_value = None
                 
-                if opponent_rank == "Unknown":
-                    audio_files.append("Unknown.ogg")
-                    print(f"\nRank unknown, playing control + character + Unknown")
-                elif opponent_rank == "Master" and mr_value:
-                    audio_files.append(f"{mr_value}.ogg")
-                elif opponent_rank in RANKS_WITH_DIVISIONS and division:
-                    audio_files.append(f"{opponent_rank}{division}.ogg")
+                if opponent_rank == "Master":
+                    stages["division"].cancel()
+                    print(f"\nMaster rank detected, checking MR region...")
+                    try:
+                        mr_value, mr_sim, timings["mr"] = stages["mr"].result()
+                        if mr_value:
+                            print(f"MR detected: {mr_value} ({mr_sim * 100:.1f}%)")
+                            mr_templates.record(mr_value)
+                        else:
+                            print(f"No MR match found (best: {mr_sim * 100:.1f}%), using base Master")
+                    except Exception as e:
+                        print(f"Error capturing MR: {e}, using base Master")
+                elif opponent_rank in RANKS_WITH_DIVISIONS and opponent_rank != "Unknown":
+                    stages["mr"].cancel()
+                    print(f"\nRank requires division check, capturing division region...")
+                    try:
+                        division, div_sim, timings["division"] = stages["division"].result()
+                        if division:
+                            print(f"Division detected: {division} ({div_sim * 100:.1f}%)")
+                            division_templates.record(division)
+                        else:
+                            print(f"No division match found (best: {div_sim * 100:.1f}%), using base rank")
+                    except Exception as e:
+                        print(f"Error capturing division: {e}, using base rank")
                 else:
-                    audio_files.append(f"{opponent_rank}.ogg")
+                    stages["mr"].cancel()
+                    stages["division"].cancel()
                 
-                print(f"\nPlaying audio sequence: {' -> '.join(audio_files)}")
-                play_audio_sequence(audio_files)
-                new_last_audio_time = current_time
+                timings["total"] = time.perf_counter() - extraction_start
+                print(f"\nExtraction timings: {format_stage_timings(timings)}")
                 
-                print("Health monitoring reset for next match")
-                print(f"{'='*60}\n")
-                return True, 'vs_screen', new_last_audio_time
-            else:
-                print(f"\nSkipping audio - opponent control not detected")
+                if announcement:
+                    if opponent_rank == "Unknown":
+                        announcement.add("Unknown.ogg")
+                        print(f"\nRank unknown, playing control + character + Unknown")
+                    elif opponent_rank == "Master" and mr_value:
+                        announcement.add(f"{mr_value}.ogg")
+                    elif opponent_rank in RANKS_WITH_DIVISIONS and division:
+                        announcement.add(f"{opponent_rank}{division}.ogg")
+                    else:
+                        announcement.add(f"{opponent_rank}.ogg")
+                    
+                    print(f"\nPlaying audio sequence: {' -> '.join(announcement.audio_files)}")
+                    if announcement.first_clip_time is not None:
+                        print(f"First clip queued after {(announcement.first_clip_time - detection_start) * 1000:.1f}ms, "
+                              f"last after {(announcement.last_clip_time - detection_start) * 1000:.1f}ms")
+                    new_last_audio_time = current_time
+                    
+                    print("Health monitoring reset for next match")
+                    print(f"{'='*60}\n")
+                    return True, 'vs_screen', new_last_audio_time
+                else:
+                    print(f"\nSkipping audio - opponent control not detected")
+                    print(f"{'='*60}\n")
+            except Exception as e:
+                print(f"Error capturing opponent rank: {e}")
                 print(f"{'='*60}\n")
-        except Exception as e:
-            print(f"Error capturing opponent rank: {e}")
-            print(f"{'='*60}\n")
+        finally:
+            if announcement:
+                announcement.close()
+                # Part of the announcement was spoken, so start the cooldown even if a later stage failed
+                if announcement.first_clip_time is not None:
+                    last_audio_time = current_time
     except Exception as e:
         print(f"Error processing ranks: {e}")
         print(f"{'='*60}\n")
@@ -1,14 +1,16 @@
 import time
 import cv2
 from capture import capture_region
-from image_processing import compare_images_no_threshold
 from audio import play_audio
-from config import CONTROL_REGIONS, NAME_REGIONS, CONTROL_SIMILARITY_THRESHOLD, NAME_THRESHOLD, get_exe_directory
+from stability import StabilityGate
+from name_bank import next_name_template_path
+from config import (
+    CONTROL_REGIONS, NAME_REGIONS, CONTROL_SIMILARITY_THRESHOLD, NAME_THRESHOLD, WIZARD_STABILITY_TIMEOUT
+)
 
 def save_player_name_image(img):
-    exe_dir = get_exe_directory()
-    player_name_path = exe_dir / "MyName.png"
     try:
+        player_name_path = next_name_template_path()
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         _, binary = cv2.threshold(gray, NAME_THRESHOLD, 255, cv2.THRESH_BINARY)
         cv2.imwrite(str(player_name_path), binary)
@@ -18,7 +20,7 @@ def save_player_name_image(img):
         print(f"Error saving player name image: {e}")
         return False
 
-def name_capture_wizard(control_images):
+def name_capture_wizard(control_templates):
     print("\n" + "="*60)
     print("PLAYER NAME CAPTURE WIZARD")
     print("="*60)
@@ -38,47 +40,39 @@ def name_capture_wizard(control_images):
             left_region = CONTROL_REGIONS[0]
             screen_img = capture_region(left_region)
             
-            best_control = None
-            best_similarity = 0
-            for control_name, control_img in control_images.items():
-                similarity = compare_images_no_threshold(screen_img, control_img)
-                if similarity > best_similarity:
-                    best_similarity = similarity
-                    best_control = control_name
+            best_control, best_similarity = control_templates.best_match(screen_img)
             
             if best_similarity >= CONTROL_SIMILARITY_THRESHOLD:
                 print("VS screen detected!")
-                print("Waiting 1 second to avoid screen blink...")
-                time.sleep(1)
+                print(f"Waiting up to {WIZARD_STABILITY_TIMEOUT:g} second(s) for the screen blink to settle...")
+                name_region = NAME_REGIONS[0]
+                gate = StabilityGate([left_region, name_region], timeout=WIZARD_STABILITY_TIMEOUT)
+                frame, waited, _ = gate.wait()
+                print(f"Waited {waited * 1000:.0f}ms")
                 
-                screen_img = capture_region(left_region)
-                recheck_best_similarity = 0
-                for control_name, control_img in control_images.items():
-                    similarity = compare_images_no_threshold(screen_img, control_img)
-                    if similarity > recheck_best_similarity:
-                        recheck_best_similarity = similarity
+                screen_img = frame.region(left_region)
+                _, recheck_best_similarity = control_templates.best_match(screen_img)
                 
                 if recheck_best_similarity >= CONTROL_SIMILARITY_THRESHOLD:
                     print("VS screen still present. Capturing player name...")
-                    name_region = NAME_REGIONS[0]
-                    name_img = capture_region(name_region)
+                    name_img = frame.region(name_region)
                     
                     if save_player_name_image(name_img):
-                        print("\nThis image will be used to detect your name on both sides.")
-                        play_audio("wizard_complete.ogg")
+                        print("\nThis image joins the name bank used to detect your name on both sides.")
+                        play_audio("wizard_complete.ogg").wait()
                         print("="*60)
                         print("SETUP COMPLETE")
                         print("="*60)
                         return True
                     else:
                         print("Failed to save player name image.\n")
-                        play_audio("wizard_error.ogg")
+                        play_audio("wizard_error.ogg").wait()
                         return False
                 else:
                     print("VS screen disappeared, retrying...\n")
         except Exception as e:
             print(f"Error during name capture: {e}")
-            play_audio("wizard_error.ogg")
+            play_audio("wizard_error.ogg").wait()
             return False
         
         if not name_captured: